@@ -1,44 +1,154 @@
-from pymongo import MongoClient
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from helpers.task_supervisor import supervisor
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
+import logging
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 class Config:
-    def __init__(self, db):
+    def __init__(self, db, snapshot_path: str = None):
         self.db = db
         self.config_collection = db['bot_config']
-        self._load_config()
-    
-    def _load_config(self):
-        """Load config from database or create default"""
-        config = self.config_collection.find_one({'_id': 'bot_config'})
-        if not config:
-            default_config = {
-                '_id': 'bot_config',
-                'auto_delete_time': int(os.getenv('AUTO_DELETE_TIME', '30')),
-                'prefix_name': os.getenv('PREFIX_NAME', ''),
-                'sudo_users': [],
-                'shortener': {
-                    'enabled': False,
-                    'api_key': '',
-                    'api_url': 'https://example.com/api'
-                }
+        # Last known config on disk, so startup doesn't wait for Mongo
+        self.snapshot_path = snapshot_path or os.getenv('CONFIG_SNAPSHOT', 'config_snapshot.json')
+        self.config = self._default_config()
+        self.version = 0  # Bumped on every change, decides which side wins when syncing
+        self.dirty = False  # Local changes Mongo hasn't seen yet
+        self.synced = asyncio.Event()
+        self._reconcile_task = None
+        self._watch_task = None
+        self.listeners = []  # Called with the changed key, or None after a full reload
+        self.has_snapshot = self._load_snapshot()
+
+    def _default_config(self) -> dict:
+        return {
+            '_id': 'bot_config',
+            'auto_delete_time': int(os.getenv('AUTO_DELETE_TIME', '30')),
+            'prefix_name': os.getenv('PREFIX_NAME', ''),
+            'sudo_users': [],
+            'shortener': {
+                'enabled': False,
+                'api_key': '',
+                'api_url': 'https://example.com/api'
             }
-            self.config_collection.insert_one(default_config)
-            self.config = default_config
+        }
+
+    def _load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable config snapshot: {str(e)}")
+            return False
+        self.config = snapshot['config']
+        self.version = snapshot.get('version', 0)
+        self.dirty = snapshot.get('dirty', False)
+        return True
+
+    def _save_snapshot(self):
+        # Write then rename, so a crash never leaves a half-written file
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': self.version, 'dirty': self.dirty, 'config': self.config}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.error(f"Error saving config snapshot: {str(e)}")
+
+    def load(self):
+        """Sync with Mongo once: the newer version wins, then refresh the snapshot"""
+        doc = self.config_collection.find_one({'_id': 'bot_config'})
+        if not doc:
+            self.config_collection.insert_one({**self.config, 'version': self.version})
+        elif self.dirty and self.version > doc.get('version', 0):
+            # Changed while Mongo was unreachable
+            self.config_collection.replace_one({'_id': 'bot_config'}, {**self.config, 'version': self.version})
         else:
-            self.config = config
-    
+            self.version = doc.pop('version', 0)
+            self.config = doc
+        self.dirty = False
+        self._save_snapshot()
+        self._notify(None)
+
+    async def reconcile(self, max_delay: int = 60):
+        """Sync with Mongo in the background, retrying with exponential backoff"""
+        delay = 1
+        while True:
+            try:
+                await asyncio.to_thread(self.load)
+                self.synced.set()
+                return
+            except PyMongoError as e:
+                logger.warning(f"Config sync failed, retrying in {delay}s: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+
+    def start_reconcile(self):
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = supervisor.spawn('config', self.reconcile)
+
+    def start_watch(self, interval: int = 5):
+        """Poll for changes made by other processes; every worker has its own Config"""
+        if not self._watch_task:
+            self._watch_task = supervisor.spawn('loops', self._watch_loop, interval)
+
+    async def _watch_loop(self, interval: int):
+        await self.synced.wait()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except PyMongoError as e:
+                logger.warning(f"Config poll failed: {str(e)}")
+
+    def refresh(self):
+        """Reload if Mongo holds a newer version than ours"""
+        if self.dirty:
+            return  # reconcile() will push our change first
+        doc = self.config_collection.find_one({'_id': 'bot_config'}, {'version': 1})
+        if doc and doc.get('version', 0) > self.version:
+            self.load()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def _notify(self, key):
+        for callback in self.listeners:
+            callback(key)
+
     def get(self, key, default=None):
         """Get config value"""
         return self.config.get(key, default)
-    
+
     def set(self, key, value):
         """Set config value"""
         self.config[key] = value
-        self.config_collection.update_one(
-            {'_id': 'bot_config'},
-            {'$set': {key: value}},
-            upsert=True
-        ) 
\ No newline at end of file
+        self._notify(key)
+        if not self.dirty:
+            try:
+                doc = self.config_collection.find_one_and_update(
+                    {'_id': 'bot_config'},
+                    {'$set': {key: value}, '$inc': {'version': 1}},
+                    projection={'version': 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                self.version = doc['version']
+                self._save_snapshot()
+                return
+            except PyMongoError as e:
+                logger.warning(f"Config saved locally only, will sync when MongoDB is back: {str(e)}")
+
+        # Keep the change on disk; the next sync pushes the whole config
+        self.version += 1
+        self.dirty = True
+        self._save_snapshot()
+        self.start_reconcile()
@@ -1,15 +1,35 @@
 from pymongo import MongoClient
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.write_concern import WriteConcern
 from dotenv import load_dotenv
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Lookups that tolerate some lag may be served by a secondary this many seconds behind (pymongo's minimum is 90)
+MAX_STALENESS = max(90, int(os.getenv('READ_MAX_STALENESS', '90')))
+# Writes we can't afford to lose wait for a majority of members and the on-disk journal
+DURABLE_WRITES = WriteConcern(w='majority', j=True)
+# Counters and flags only wait for the primary
+RELAXED_WRITES = WriteConcern(w=1)
+
 def connect_db():
-    try:
-        client = MongoClient(os.getenv('MONGODB_URI'))
-        db = client[os.getenv('DB_NAME', 'file_sharing_bot')]
-        print("MongoDB connected successfully!")
-        return db
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {str(e)}")
-        return None 
\ No newline at end of file
+    """Create the MongoDB client. It connects in the background, so a slow or down server doesn't stop startup"""
+    # Fail fast per operation while the server is unreachable instead of hanging handlers for 30s
+    client = MongoClient(os.getenv('MONGODB_URI'), serverSelectionTimeoutMS=5000)
+    db = client[os.getenv('DB_NAME', 'file_sharing_bot')]
+    logger.info("MongoDB client created")
+    return db
+
+def secondary_reads(collection):
+    """Read from a secondary at most MAX_STALENESS behind, or the primary when none qualifies"""
+    return collection.with_options(read_preference=SecondaryPreferred(max_staleness=MAX_STALENESS))
+
+def durable_writes(collection):
+    return collection.with_options(write_concern=DURABLE_WRITES)
+
+def relaxed_writes(collection):
+    return collection.with_options(write_concern=RELAXED_WRITES)
@@ -0,0 +1,42 @@
+import os
+
+OWNER = 'owner'
+SUDO = 'sudo'
+
+class ACL:
+    """Admin ids and roles, precomputed and rebuilt only when the sudo list changes"""
+    def __init__(self, config):
+        self.config = config
+        self.roles = {}  # user id -> role
+        self.admins = frozenset()
+        self.refresh()
+        config.add_listener(self._on_config_change)
+
+    def refresh(self):
+        """Rebuild the lookup tables from ADMIN_ID, SUDO_USERS and the sudo list in config"""
+        roles = {}
+        env_sudo = [int(id.strip()) for id in os.getenv('SUDO_USERS', '').split(',') if id.strip()]
+        for user_id in list(self.config.get('sudo_users', [])) + env_sudo:
+            roles[int(user_id)] = SUDO
+        owner_id = int(os.getenv('ADMIN_ID', '0'))
+        if owner_id:
+            roles[owner_id] = OWNER
+        self.roles = roles
+        self.admins = frozenset(roles)
+
+    def _on_config_change(self, key: str):
+        # key is None when the whole config was reloaded
+        if key in (None, 'sudo_users'):
+            self.refresh()
+
+    def is_admin(self, user_id: int) -> bool:
+        """Check if user is the owner or a sudo user"""
+        return user_id in self.admins
+
+    def role(self, user_id: int):
+        return self.roles.get(user_id)
+
+    def has_role(self, user_id: int, role: str) -> bool:
+        """The owner has every role"""
+        user_role = self.roles.get(user_id)
+        return user_role == role or user_role == OWNER
@@ -1,30 +1,157 @@
 from telegram import Update, Message
 from telegram.ext import ContextTypes
+from .task_supervisor import supervisor
 import asyncio
 import os
+import time
 from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 class AutoDeleteHandler:
     def __init__(self, db):
         # Get delete time from database
         self.db = db
-        self.delete_time = self.get_delete_time_from_db()
+        self.pending_collection = db['pending_deletes']  # Survives restarts
+        self.delete_time = 30  # Minutes, until load_delete_time() reads the setting
+        self.tasks = set()
+        self.deadlines = {}  # (bot_id, chat_id, message_id) -> delete_at, moved later by remind_delivery()
+        self.deliveries = {}  # (bot_id, chat_id, code) -> (message ids, delete_at) still in the chat
 
     def get_delete_time_from_db(self):
         # Fetch the delete time from the database
         settings = self.db['settings'].find_one({"name": "auto_delete_time"})
         return settings.get('value', 30) if settings else 30
 
-    async def schedule_delete(self, message: Message):
-        """Schedule a message for deletion"""
-        if self.delete_time > 0:
-            await asyncio.sleep(self.delete_time * 60)  # Convert minutes to seconds
+    def load_delete_time(self):
+        self.delete_time = self.get_delete_time_from_db()
+
+    def ensure_indexes(self):
+        # Every bot numbers its own messages, so a chat and message id alone can belong to several bots
+        self.pending_collection.create_index([('bot_id', 1), ('chat_id', 1), ('message_id', 1)])
+
+    async def schedule_delete(self, messages: list[Message], delete_at: float = None):
+        """Schedule messages sent by one bot to one chat for deletion, with one write each way"""
+        if self.delete_time > 0 and messages:
+            bot = messages[0].get_bot()
+            chat_id = messages[0].chat_id
+            delete_at = delete_at or time.time() + self.delete_time * 60  # Convert minutes to seconds
+            message_ids = [message.message_id for message in messages]
+            await asyncio.to_thread(self.pending_collection.insert_many, [
+                {"bot_id": bot.id, "chat_id": chat_id, "message_id": message_id, "delete_at": delete_at}
+                for message_id in message_ids
+            ])
+            await self._delete_at(bot, chat_id, message_ids, delete_at)
+
+    async def _delete_at(self, bot, chat_id: int, message_ids: list, delete_at: float):
+        keys = [(bot.id, chat_id, message_id) for message_id in message_ids]
+        for key in keys:
+            self.deadlines[key] = max(delete_at, self.deadlines.get(key, 0))
+        try:
+            # The deadline can move while we sleep
+            while (deadline := max(self.deadlines[key] for key in keys)) > time.time():
+                await asyncio.sleep(deadline - time.time())
+        finally:
+            for key in keys:
+                self.deadlines.pop(key, None)
+        for message_id in message_ids:
             try:
-                await message.delete()
+                await bot.delete_message(chat_id=chat_id, message_id=message_id)
             except Exception as e:
-                print(f"Error deleting message: {str(e)}")
+                logger.error(f"Error deleting message: {str(e)}")
+        await asyncio.to_thread(
+            self.pending_collection.delete_many,
+            {"bot_id": bot.id, "chat_id": chat_id, "message_id": {"$in": message_ids}}
+        )
+
+    def _track(self, func, *args):
+        task = supervisor.spawn('auto_delete', func, *args)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
 
-    async def handle_shared_files(self, sent_messages: list[Message]):
+    async def handle_shared_files(self, sent_messages: list[Message], code: str = None):
         """Handle auto deletion for shared files"""
+        if self.delete_time <= 0:
+            return
+        delete_at = time.time() + self.delete_time * 60
+        # One timer and one write per bot and chat, not per message
+        groups = {}
         for message in sent_messages:
-            asyncio.create_task(self.schedule_delete(message)) 
\ No newline at end of file
+            groups.setdefault((message.get_bot().id, message.chat_id), []).append(message)
+        for messages in groups.values():
+            self._track(self.schedule_delete, messages, delete_at)
+
+        # Remember the delivery so repeated taps on the same link don't resend it
+        if code and sent_messages:
+            self._prune_deliveries()
+            first = sent_messages[0]
+            key = (first.get_bot().id, first.chat_id, code)
+            self.deliveries[key] = ([message.message_id for message in sent_messages], delete_at)
+
+    def _prune_deliveries(self):
+        now = time.time()
+        for key in [key for key, (_, delete_at) in self.deliveries.items() if delete_at <= now]:
+            del self.deliveries[key]
+
+    async def remind_delivery(self, bot, chat_id: int, code: str, margin: int = 10) -> bool:
+        """Point a repeat request at the copy already in the chat and push its deletion back.
+        Returns False when there is no live delivery and the files should be sent again"""
+        key = (bot.id, chat_id, code)
+        delivery = self.deliveries.get(key)
+        if not delivery or delivery[1] - margin <= time.time():
+            return False
+        message_ids, _ = delivery
+
+        try:
+            # Reply to the first file; fails if the user already deleted it
+            notice = await bot.send_message(
+                chat_id=chat_id,
+                text=(
+                    f"⬆️ You already have this above. It will now be deleted {self.delete_time} minutes from now.\n\n"
+                    f"⬆️ ফাইলটি উপরে ইতিমধ্যে পাঠানো হয়েছে। এটি এখন থেকে {self.delete_time} মিনিট পর মুছে ফেলা হবে।"
+                ),
+                reply_to_message_id=message_ids[1] if len(message_ids) > 1 else message_ids[0],
+                allow_sending_without_reply=False
+            )
+        except Exception:
+            del self.deliveries[key]
+            return False
+
+        delete_at = time.time() + self.delete_time * 60
+        for message_id in message_ids:
+            self.deadlines[(bot.id, chat_id, message_id)] = delete_at
+        await asyncio.to_thread(
+            self.pending_collection.update_many,
+            {"bot_id": bot.id, "chat_id": chat_id, "message_id": {"$in": message_ids}},
+            {"$set": {"delete_at": delete_at}}
+        )
+        self._track(self.schedule_delete, [notice], delete_at)
+        self.deliveries[key] = (message_ids + [notice.message_id], delete_at)
+        return True
+
+    async def resume(self, bot_pool):
+        """Reschedule deletions left pending by the previous run"""
+        bots = {bot.id: bot for bot in bot_pool.bots}
+        pending = await asyncio.to_thread(lambda: list(self.pending_collection.find({})))
+        # Messages of one delivery share a deadline; give them one timer again
+        groups = {}
+        for doc in pending:
+            groups.setdefault((doc['bot_id'], doc['chat_id'], doc['delete_at']), []).append(doc['message_id'])
+        for (bot_id, chat_id, delete_at), message_ids in groups.items():
+            if bot_id not in bots:
+                # Only the bot that sent a message can delete it, and its rows are keyed by its id
+                logger.warning(f"Dropping {len(message_ids)} pending deletions of bot {bot_id}, which is no longer configured")
+                await asyncio.to_thread(
+                    self.pending_collection.delete_many,
+                    {"bot_id": bot_id, "chat_id": chat_id, "message_id": {"$in": message_ids}}
+                )
+                continue
+            self._track(self._delete_at, bots[bot_id], chat_id, message_ids, delete_at)
+        if pending:
+            logger.info(f"Rescheduled {len(pending)} pending deletions")
+
+    def stop(self):
+        """Drop the timers; the deletions stay in the database for the next run"""
+        for task in list(self.tasks):
+            task.cancel()
@@ -1,27 +1,68 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from helpers.login_handler import LoginHandler
+from telegram.ext import ContextTypes
+from telethon import events
+from telethon.errors import BadRequestError, FloodWaitError
+from collections import OrderedDict
+from .rate_limiter import RateLimiter
+from .task_supervisor import supervisor
+import asyncio
 import logging
+import time
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AutoForwardHandler:
-    def __init__(self, config, db):
+    def __init__(self, config, db, login_handler, acl, queue_size: int = 1000, batch_size: int = 100,
+                 batch_window: float = 1.0, max_seen: int = 10000):
         self.config = config
+        self.db = db
+        self.settings_collection = db['autoforward']
+        self.login_handler = login_handler
+        self.acl = acl
+        self.queue = asyncio.Queue(maxsize=queue_size)  # Full queue pauses history reads and drops live events
+        self.batch_size = batch_size  # Telegram forwards at most 100 messages per call
+        self.batch_window = batch_window
+        self.rate_limiter = RateLimiter(rate=20, per=60)
+        self.max_seen = max_seen
+        self.seen = OrderedDict()  # Recent (chat, message) and content ids
+        self.forwarded = 0
+        self.worker_task = None
+        self.catch_up_task = None
+        supervisor.add_group('autoforward', retries=3)
+        self.event_handler = None
         self.target_channel = None
         self.source_channels = []
-        self.login_handler = LoginHandler(db)
+        self.offsets = {}  # source peer id -> last forwarded message id
+        self.outstanding = {}  # source peer id -> ids queued but not forwarded yet
+        self.overflowed = {}  # source peer id -> task re-reading history after live events were dropped
+
+    def _load_settings(self) -> dict:
+        return self.settings_collection.find_one({"_id": "settings"}) or {}
+
+    def load_settings(self):
+        """Read target, sources and offsets saved by earlier runs"""
+        settings = self._load_settings()
+        self.target_channel = settings.get('target')
+        self.source_channels = settings.get('sources', [])
+        self.offsets = {int(k): v for k, v in settings.get('offsets', {}).items()}
+        return settings
+
+    def _save(self, values: dict):
+        self.settings_collection.update_one({"_id": "settings"}, {"$set": values}, upsert=True)
+
+    @property
+    def is_running(self) -> bool:
+        return self.worker_task is not None and not self.worker_task.done()
 
     async def handle_autoforward_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /autoforward command"""
         keyboard = [
-            [InlineKeyboardButton("🔑 Login", callback_data='login')],
-            [InlineKeyboardButton("🎯 Set Target", callback_data='set_target')],
-            [InlineKeyboardButton("📥 Set Source", callback_data='set_source')],
-            [InlineKeyboardButton("▶️ Run", callback_data='run')],
-            [InlineKeyboardButton("❌ Close", callback_data='close')]
+            [InlineKeyboardButton("🔑 Login", callback_data='af_login')],
+            [InlineKeyboardButton("🎯 Set Target", callback_data='af_set_target')],
+            [InlineKeyboardButton("📥 Set Source", callback_data='af_set_source')],
+            [InlineKeyboardButton("▶️ Run", callback_data='af_run'), InlineKeyboardButton("⏹ Stop", callback_data='af_stop')],
+            [InlineKeyboardButton("📊 Status", callback_data='af_status')],
+            [InlineKeyboardButton("❌ Close", callback_data='af_close')]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await update.message.reply_text('Choose an option:', reply_markup=reply_markup)
@@ -29,43 +70,264 @@ class AutoForwardHandler:
     async def button_click(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
+        # Callback data can be sent by any client, not just from the admin's /autoforward menu
+        if not self.acl.is_admin(query.from_user.id):
+            return
         logger.info(f"Button clicked: {query.data}")
 
-        if query.data == 'login':
+        if query.data == 'af_login':
             await self.login_handler.handle_login(update, context)
 
-        elif query.data == 'set_target':
+        elif query.data == 'af_set_target':
+            context.user_data['af_awaiting'] = 'target'
             await query.edit_message_text(text="Please send the target channel/group ID.")
 
-        elif query.data == 'set_source':
+        elif query.data == 'af_set_source':
+            context.user_data['af_awaiting'] = 'sources'
             await query.edit_message_text(text="Please send the source channel/group IDs separated by commas.")
 
-        elif query.data == 'run':
-            await query.edit_message_text(text="Auto-forwarding started.")
+        elif query.data == 'af_run':
+            error = await self.start()
+            await query.edit_message_text(text=error or "Auto-forwarding started.")
+
+        elif query.data == 'af_stop':
+            await self.stop()
+            self._save({"running": False})
+            await query.edit_message_text(text="Auto-forwarding stopped.")
 
-        elif query.data == 'close':
+        elif query.data == 'af_status':
+            await query.edit_message_text(text=self._status_text())
+
+        elif query.data == 'af_close':
             await query.edit_message_text(text="Auto-forward setup closed.")
 
-    async def forward_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Forward messages from source to target"""
-        if not self.login_handler.is_logged_in:
-            await update.message.reply_text("Please login first.")
+    async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle target/source replies, otherwise pass the text on to the login flow"""
+        if not update.effective_user or not self.acl.is_admin(update.effective_user.id):
+            return
+        awaiting = context.user_data.pop('af_awaiting', None)
+        if not awaiting:
+            await self.login_handler.handle_text(update, context)
             return
 
-        if not self.target_channel:
-            await update.message.reply_text("Target channel/group not set.")
+        values = [self._parse_chat(v) for v in update.message.text.split(',') if v.strip()]
+        if not values:
+            await update.message.reply_text("No channel given. Please try again from /autoforward.")
             return
 
+        if awaiting == 'target':
+            self.target_channel = values[0]
+            self._save({"target": self.target_channel})
+            await update.message.reply_text(f"🎯 Target set to {self.target_channel}")
+        else:
+            self.source_channels = values
+            self._save({"sources": self.source_channels})
+            await update.message.reply_text(f"📥 Sources set to {', '.join(map(str, values))}")
+
+        if self.is_running:
+            await update.message.reply_text("Restart auto-forwarding (Stop, then Run) to apply the change.")
+
+    def _parse_chat(self, value: str):
+        value = value.strip()
+        return int(value) if value.lstrip('-').isdigit() else value
+
+    def _status_text(self) -> str:
+        return (
+            f"📊 Auto-forward status\n\n"
+            f"Running: {'Yes' if self.is_running else 'No'}\n"
+            f"Target: {self.target_channel or 'Not set'}\n"
+            f"Sources: {', '.join(map(str, self.source_channels)) or 'Not set'}\n"
+            f"Queued: {self.queue.qsize()}\n"
+            f"Forwarded: {self.forwarded}\n"
+            f"Offsets: {self.offsets}"
+        )
+
+    async def start(self):
+        """Start forwarding. Returns an error message, or None on success"""
+        if self.is_running:
+            return "Auto-forwarding is already running."
+        if not await self.login_handler.ensure_connected():
+            return "Please login first."
+        if not self.target_channel:
+            return "Target channel/group not set."
         if not self.source_channels:
-            await update.message.reply_text("Source channels/groups not set.")
+            return "Source channels/groups not set."
+
+        client = self.login_handler.client
+        source_ids = [await client.get_peer_id(source) for source in self.source_channels]
+
+        self.worker_task = supervisor.spawn('autoforward', self._worker)
+        self.catch_up_task = supervisor.spawn('autoforward', self._catch_up, source_ids)
+        self._save({"running": True})
+        return None
+
+    async def resume(self):
+        """Restart forwarding after a bot restart if it was running before"""
+        settings = await asyncio.to_thread(self.load_settings)
+        if settings.get('running'):
+            error = await self.start()
+            if error:
+                logger.info(f"Auto-forward not resumed: {error}")
+
+    async def stop(self):
+        """Stop intake, forward what is already queued and persist offsets"""
+        if self.event_handler:
+            self.login_handler.client.remove_event_handler(self.event_handler)
+            self.event_handler = None
+        if self.catch_up_task:
+            self.catch_up_task.cancel()
+            self.catch_up_task = None
+        for task in self.overflowed.values():
+            task.cancel()
+        self.overflowed = {}
+        if self.worker_task:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=30)
+            except asyncio.TimeoutError:
+                logger.info(f"Auto-forward stopped with {self.queue.qsize()} queued messages")
+            self.worker_task.cancel()
+            self.worker_task = None
+
+    async def _catch_up(self, source_ids: list):
+        """Queue messages missed while stopped, then subscribe to new ones"""
+        client = self.login_handler.client
+        for source_id in source_ids:
+            if source_id not in self.offsets:
+                # First run for this source: start from now instead of the whole history
+                latest = await client.get_messages(source_id, limit=1)
+                self.offsets[source_id] = latest[0].id if latest else 0
+                self._save({f"offsets.{source_id}": self.offsets[source_id]})
+            await self._queue_history(source_id)
+
+        self.event_handler = self._on_new_message
+        client.add_event_handler(self.event_handler, events.NewMessage(chats=source_ids))
+
+        # Cover the gap between the history pass and the subscription
+        for source_id in source_ids:
+            await self._queue_history(source_id)
+
+    async def _queue_history(self, source_id: int):
+        client = self.login_handler.client
+        async for message in client.iter_messages(source_id, reverse=True, min_id=self.offsets.get(source_id, 0)):
+            await self._enqueue(message)
+
+    async def _on_new_message(self, event):
+        source_id = event.message.chat_id
+        # Telethon runs every update in its own task, so waiting for room here would only pile
+        # up tasks. Drop the event instead and re-read the source's history once there is room.
+        if source_id in self.overflowed or self.queue.full():
+            if source_id not in self.overflowed:
+                logger.warning(f"Auto-forward queue full, re-reading {source_id} from history")
+                self.overflowed[source_id] = supervisor.spawn('autoforward', self._recover, source_id)
+            return
+        await self._enqueue(event.message)
+
+    async def _recover(self, source_id: int):
+        """Queue the messages dropped while the queue was full"""
+        while self.queue.qsize() > self.queue.maxsize // 2:
+            await asyncio.sleep(1)
+        # Live events queue again from here; the history pass below covers everything before them
+        self.overflowed.pop(source_id, None)
+        try:
+            await self._queue_history(source_id)
+        except Exception:
+            # Drop live events again until the retry has re-read the history
+            self.overflowed[source_id] = asyncio.current_task()
+            raise
+
+    def _mark_seen(self, key) -> bool:
+        """Remember a key; returns False if it was already seen recently"""
+        if key in self.seen:
+            return False
+        self.seen[key] = True
+        while len(self.seen) > self.max_seen:
+            self.seen.popitem(last=False)
+        return True
+
+    def _content_id(self, message):
+        if message.media is not None:
+            media = message.photo or message.document
+            return ('media', media.id) if media else None
+        if message.message:
+            return ('text', hash(message.message))
+        return None
+
+    async def _enqueue(self, message):
+        if message.action is not None:
+            return  # Service messages can't be forwarded
+        if not self._mark_seen(('msg', message.chat_id, message.id)):
             return
+        content_id = self._content_id(message)
+        if content_id and not self._mark_seen(content_id):
+            # Same content already forwarded from another source; just advance the offset
+            self.offsets[message.chat_id] = max(self.offsets.get(message.chat_id, 0), message.id)
+            return
+        self.outstanding.setdefault(message.chat_id, set()).add(message.id)
+        await self.queue.put(message)
+
+    def _save_offset(self, source_id: int):
+        """Persist the offset, but never past a message that is still waiting to be forwarded"""
+        pending = self.outstanding.get(source_id)
+        offset = min(pending) - 1 if pending else self.offsets.get(source_id, 0)
+        self._save({f"offsets.{source_id}": offset})
+
+    async def _next_batch(self) -> list:
+        """Wait for one message, then collect more for up to batch_window seconds"""
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        client = self.login_handler.client
+        while True:
+            batch = await self._next_batch()
+            try:
+                by_source = {}
+                for message in batch:
+                    by_source.setdefault(message.chat_id, []).append(message.id)
 
-        # Implement message forwarding logic here
+                for source_id, ids in by_source.items():
+                    ids.sort()
+                    await self._forward(client, source_id, ids)
+                    self.forwarded += len(ids)
+                    self.outstanding[source_id].difference_update(ids)
+                    self.offsets[source_id] = max(self.offsets.get(source_id, 0), ids[-1])
+                    self._save_offset(source_id)
+            except Exception as e:
+                logger.error(f"Error forwarding messages: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
 
-def setup_handlers(application, config, db):
-    autoforward_handler = AutoForwardHandler(config, db)
-    application.add_handler(CommandHandler("autoforward", autoforward_handler.handle_autoforward_command))
-    application.add_handler(CallbackQueryHandler(autoforward_handler.button_click))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, autoforward_handler.login_handler.check_phone))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, autoforward_handler.login_handler.check_code))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, autoforward_handler.login_handler.check_password))
+    async def _forward(self, client, source_id: int, ids: list, max_delay: int = 60):
+        """Forward until it succeeds; only messages Telegram rejects outright are skipped"""
+        delay = 1
+        while True:
+            await self.rate_limiter.acquire()
+            try:
+                await client.forward_messages(self.target_channel, ids, from_peer=source_id)
+                return
+            except FloodWaitError as e:
+                logger.info(f"Flood wait for {e.seconds}s while forwarding")
+                await asyncio.sleep(e.seconds)
+            except BadRequestError as e:
+                if len(ids) == 1:
+                    logger.error(f"Skipping message {ids[0]} from {source_id}, it can't be forwarded: {str(e)}")
+                    return
+                # One bad message fails the whole call, so send the rest one by one
+                for message_id in ids:
+                    await self._forward(client, source_id, [message_id], max_delay)
+                return
+            except Exception as e:
+                # Network trouble or a Telegram-side error: keep the batch and try again
+                logger.warning(f"Error forwarding messages, retrying in {delay}s: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
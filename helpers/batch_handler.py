@@ -1,17 +1,26 @@
 from typing import List
 from telegram import Update
 from telegram.ext import ContextTypes
-from .auto_delete_handler import AutoDeleteHandler
+from telegram.error import BadRequest
+import asyncio
 import os
+import time
 from .shortener import Shortener
+from .task_supervisor import supervisor
+import logging
+
+logger = logging.getLogger(__name__)
 
 class BatchHandler:
-    def __init__(self, db, config):
+    def __init__(self, db, config, file_sender, auto_delete, ingest_journal, progress_interval: float = 3):
         self.db = db
         self.user_files = {}  # Store temporary files for batch processing
-        self.auto_delete = AutoDeleteHandler(db)
+        self.auto_delete = auto_delete
+        self.ingest_journal = ingest_journal
         self.shortener = Shortener(config)
         self.config = config
+        self.file_sender = file_sender
+        self.progress_interval = progress_interval  # Min seconds between edits of a progress message
         
     async def handle_batch_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /batch command"""
@@ -28,16 +37,18 @@ class BatchHandler:
                 
             # Store user's batch request
             user_id = update.effective_user.id
-            self.user_files[user_id] = {
+            self._cancel_progress(self.user_files.get(user_id))
+            batch_info = {
                 'requested_count': count,
                 'files': [],
-                'message_id': update.message.message_id
+                'message_id': update.message.message_id,
+                'progress_edited': 0,
+                'progress_task': None
             }
             
-            await update.message.reply_text(
-                f"Please send {count} files one by one.\n"
-                f"Files received: 0/{count}"
-            )
+            # Edited in place as files arrive, instead of one reply per file
+            batch_info['progress_message'] = await update.message.reply_text(self._progress_text(batch_info))
+            self.user_files[user_id] = batch_info
             
         except ValueError:
             await update.message.reply_text("Please provide a valid number.\nExample: /batch 4")
@@ -55,26 +66,61 @@ class BatchHandler:
         # Add file to batch
         file_info = self._get_file_info(update.message)
         if file_info:
+            # Keep a copy that delivery bots can read
+            file_info.update(await self.file_sender.store(update.message))
             batch_info['files'].append(file_info)
             
             # Update progress
             files_received = len(batch_info['files'])
             total_files = batch_info['requested_count']
             
-            await update.message.reply_text(
-                f"File {files_received} of {total_files} received.\n"
-                f"{'Batch complete!' if files_received == total_files else f'Send {total_files - files_received} more files.'}"
-            )
-            
             # If batch is complete, create batch link
             if files_received == total_files:
+                self._cancel_progress(batch_info)
+                total_size = sum(getattr(f['file'], 'file_size', None) or 0 for f in batch_info['files'])
+                await self._edit_progress(
+                    batch_info,
+                    f"\n\n✅ Batch complete: {total_files} files, {total_size / 1024 / 1024:.1f} MB."
+                )
                 await self._create_batch_link(update, context, batch_info['files'])
                 del self.user_files[user_id]
+            else:
+                self._schedule_progress(batch_info)
                 
             return True
             
         return False
     
+    def _progress_text(self, batch_info) -> str:
+        count = batch_info['requested_count']
+        return f"Please send {count} files one by one.\nFiles received: {len(batch_info['files'])}/{count}"
+
+    def _schedule_progress(self, batch_info):
+        """Edit the progress message now, or once the interval has passed since the last edit"""
+        if batch_info['progress_task']:
+            return  # The pending edit will pick up this file too
+        delay = max(0, batch_info['progress_edited'] + self.progress_interval - time.monotonic())
+        batch_info['progress_task'] = supervisor.spawn('batch_progress', self._delayed_progress, batch_info, delay)
+
+    async def _delayed_progress(self, batch_info, delay: float):
+        await asyncio.sleep(delay)
+        batch_info['progress_task'] = None
+        await self._edit_progress(batch_info)
+
+    async def _edit_progress(self, batch_info, suffix: str = ""):
+        batch_info['progress_edited'] = time.monotonic()
+        try:
+            await batch_info['progress_message'].edit_text(self._progress_text(batch_info) + suffix)
+        except BadRequest as e:
+            # Nothing changed since the last edit
+            if 'not modified' not in str(e).lower():
+                logger.error(f"Error updating batch progress: {str(e)}")
+
+    def _cancel_progress(self, batch_info):
+        if batch_info and batch_info['progress_task']:
+            batch_info['progress_task'].cancel()
+            batch_info['progress_task'] = None
+
     def _get_file_info(self, message):
         """Extract file information from message"""
         file_info = None
@@ -97,55 +143,58 @@ class BatchHandler:
     async def _create_batch_link(self, update: Update, context: ContextTypes.DEFAULT_TYPE, files: List[dict]):
         """Create a shareable link for batch of files"""
         try:
-            batch_code = str(abs(hash(str(files) + str(update.effective_user.id))))[:8]
-            
             # Save batch info
             batch_data = {
-                'batch_code': batch_code,
                 'files': [
                     {
                         'file_id': f['file'].file_id,
                         'file_type': f['type'],
                         'file_name': f['file_name'],
-                        'caption': f['caption']
+                        'caption': f['caption'],
+                        **{k: f[k] for k in ('storage_chat_id', 'storage_message_id') if k in f}
                     }
                     for f in files
                 ],
                 'user_id': update.effective_user.id
             }
             
-            self.db['batches'].insert_one(batch_data)
+            batch_code = await self.ingest_journal.append('batches', batch_data)
             
             # Generate permanent link using worker URL
             worker_url = os.getenv('WORKER_URL', '').rstrip('/')
             share_link = f"{worker_url}/batch_{batch_code}"
             
-            # Shorten the link if enabled
-            shortened_link = await self.shortener.shorten_url(share_link)
-            
             # Prepare file names or captions
             file_details = "\n".join(
                 f"{i+1}. {f['caption'] or f['file_name'] or 'No Name'}"
                 for i, f in enumerate(batch_data['files'])
             )
             
-            await update.message.reply_text(
-                f"Here's your batch shareable link:\n{shortened_link}\n\nFiles:\n{file_details}"
+            # Reply with the worker link right away; the short link is edited in when it's ready
+            reply = await update.message.reply_text(
+                f"Here's your batch shareable link:\n{share_link}\n\nFiles:\n{file_details}"
             )
+            self.shortener.shorten_later(reply, share_link)
             
         except Exception as e:
-            print(f"Error creating batch link: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception(f"Error creating batch link: {str(e)}")
             await update.message.reply_text("Sorry, couldn't create batch link!")
 
-    async def handle_batch_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE, batch_doc):
-        """Handle batch file sharing with auto-delete"""
+    async def handle_batch_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE, batch_doc) -> bool:
+        """Handle batch file sharing with auto-delete. Returns True if any file was sent"""
+        if not all(self.file_sender.can_send(context.bot, f) for f in batch_doc['files']):
+            # Only the primary bot holds these files
+            await update.message.reply_text(
+                f"Please get these files here:\n{self.file_sender.primary_link('batch_' + batch_doc['batch_code'])}"
+            )
+            return False
+
         try:
             sent_messages = []
             
             # Fetch auto-delete time from config
             delete_time = self.config.get('auto_delete_time', 30)
+            await self.file_sender.bot_pool.acquire(context.bot)
             info_msg = await update.message.reply_text(
                 f"⚠️ These files will be automatically deleted after {delete_time} minute{'s' if delete_time != 1 else ''}!\n"
                 f"🔄 Forward this File to save the files.\n\n"
@@ -156,54 +205,20 @@ class BatchHandler:
             
             for file_info in batch_doc['files']:
                 try:
-                    file_type = file_info.get('file_type', 'document')
-                    caption = file_info.get('caption', '')
-                    prefix_name = self.config.get('prefix_name', '@CinemazBD')
-                    
-                    # Format caption
-                    if caption:
-                        caption = f"{prefix_name} - {caption}"
-                    else:
-                        caption = f"{prefix_name}\n<b>Here's your file!</b>"
-                    
-                    # Make the whole caption bold
-                    caption = f"<b>{caption}</b>"
-                    
-                    if file_type == 'photo':
-                        sent_msg = await update.message.reply_photo(
-                            photo=file_info['file_id'],
-                            caption=caption,
-                            parse_mode='HTML'
-                        )
-                    elif file_type == 'video':
-                        sent_msg = await update.message.reply_video(
-                            video=file_info['file_id'],
-                            caption=caption,
-                            parse_mode='HTML'
-                        )
-                    elif file_type == 'audio':
-                        sent_msg = await update.message.reply_audio(
-                            audio=file_info['file_id'],
-                            caption=caption,
-                            parse_mode='HTML'
-                        )
-                    else:
-                        sent_msg = await update.message.reply_document(
-                            document=file_info['file_id'],
-                            caption=caption,
-                            parse_mode='HTML'
-                        )
-                    
+                    sent_msg = await self.file_sender.send_file(context.bot, update.effective_chat.id, file_info)
                     sent_messages.append(sent_msg)
                     
                 except Exception as e:
-                    print(f"Error sending batch file: {str(e)}")
+                    logger.error(f"Error sending batch file: {str(e)}")
                     continue
             
             # Schedule all messages for deletion
             if sent_messages:
-                await self.auto_delete.handle_shared_files(sent_messages)
+                await self.auto_delete.handle_shared_files(sent_messages, 'batch_' + batch_doc['batch_code'])
+            # The first message is the notice, not a file
+            return len(sent_messages) > 1
                     
         except Exception as e:
-            print(f"Error processing batch: {str(e)}")
-            await update.message.reply_text("Sorry, couldn't process the batch!") 
\ No newline at end of file
+            logger.error(f"Error processing batch: {str(e)}")
+            await update.message.reply_text("Sorry, couldn't process the batch!")
+            return False 
\ No newline at end of file
@@ -0,0 +1,57 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from .rate_limiter import RateLimiter
+from collections import Counter
+import zlib
+
+class BotPool:
+    """Bots sharing this process: the primary handles everything, the rest help deliver files"""
+    def __init__(self, messages_per_second: int = 25):
+        self.bots = []  # Primary bot first
+        self.messages_per_second = messages_per_second
+        self.limiters = {}  # bot token -> RateLimiter
+        self.sent = Counter()  # bot username -> messages sent
+
+    def add(self, bot):
+        self.bots.append(bot)
+        self.limiters[bot.token] = RateLimiter(rate=self.messages_per_second, per=1)
+
+    @property
+    def primary(self):
+        return self.bots[0] if self.bots else None
+
+    def is_primary(self, bot) -> bool:
+        return bool(self.bots) and bot.token == self.bots[0].token
+
+    def _index(self, key: str) -> int:
+        # crc32 is stable across processes and matches worker.js
+        return zlib.crc32(key.encode()) % len(self.bots)
+
+    def bot_for_code(self, code: str):
+        """Pick the bot that serves a share code"""
+        return self.bots[self._index(code)] if self.bots else None
+
+    def username_for_code(self, code: str):
+        bot = self.bot_for_code(code)
+        return bot.username if bot else None
+
+    def bot_for_user(self, user_id: int, bot_ids: list = None):
+        """Pick a bot to message a user, among the bots the user has started"""
+        candidates = [bot for bot in self.bots if bot_ids and bot.id in bot_ids] or [self.primary]
+        return candidates[user_id % len(candidates)]
+
+    async def acquire(self, bot):
+        """Wait for a send slot under this bot's rate limit"""
+        limiter = self.limiters.get(bot.token)
+        if limiter:
+            await limiter.acquire()
+        self.sent[bot.username] += 1
+
+    async def handle_bots_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /bots command"""
+        text = "🤖 <b>Delivery bots</b>\n\n"
+        for i, bot in enumerate(self.bots):
+            role = 'primary' if i == 0 else 'delivery'
+            text += f"{i+1}. @{bot.username} ({role}) - {self.sent[bot.username]} messages sent\n"
+        text += f"\nLimit: {self.messages_per_second} messages/second per bot"
+        await update.message.reply_text(text, parse_mode='HTML')
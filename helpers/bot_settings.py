@@ -1,18 +1,23 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler
 from telegram.error import BadRequest
+from .task_supervisor import supervisor
 import json
 import os
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 class BotSettings:
-    def __init__(self, config):
+    def __init__(self, config, acl):
         self.config = config
+        self.acl = acl
         self.waiting_for_input = {}  # Track users waiting for input
     
     async def handle_settings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /bset command"""
-        if not await self._is_admin(update.effective_user.id):
+        if not self.acl.is_admin(update.effective_user.id):
             await update.message.reply_text("You don't have permission to use this command!")
             return
         
@@ -47,6 +52,8 @@ class BotSettings:
         """Handle callback queries from settings buttons"""
         query = update.callback_query
         await query.answer()
+        if not self.acl.is_admin(query.from_user.id):
+            return
         
         if query.data == "setting_close":
             await query.message.delete()
@@ -115,7 +122,7 @@ class BotSettings:
     async def _show_setting_editor(self, message, setting_type, user_id):
         """Show editor for specific setting"""
         try:
-            print(f"Showing editor for setting type: {setting_type}")  # Debug print
+            logger.debug(f"Showing editor for setting type: {setting_type}")
             
             keyboard = [
                 [InlineKeyboardButton("🔄 Reset to Default", callback_data=f"reset_{setting_type}")],
@@ -173,12 +180,11 @@ class BotSettings:
             self.waiting_for_input[user_id] = {
                 'type': setting_type,
                 'message': message,
-                'expires': asyncio.create_task(self._expire_input(user_id, message))
+                'expires': supervisor.spawn('settings', self._expire_input, user_id, message)
             }
             
         except Exception as e:
-            print(f"Error in _show_setting_editor: {str(e)}")  # Debug print
-            print(f"Setting type: {setting_type}")  # Debug print
+            logger.error(f"Error in _show_setting_editor for {setting_type}: {str(e)}")
             keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data="setting_menu")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await message.edit_text(
@@ -324,7 +330,7 @@ class BotSettings:
             )
             
         except Exception as e:
-            print(f"Error in handle_reset: {str(e)}")
+            logger.error(f"Error in handle_reset: {str(e)}")
             keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data="setting_menu")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.message.edit_text(
@@ -333,12 +339,6 @@ class BotSettings:
                 parse_mode='HTML'
             )
     
-    async def _is_admin(self, user_id: int) -> bool:
-        """Check if user is admin"""
-        admin_id = int(os.getenv('ADMIN_ID', '0'))
-        sudo_users = self.config.get('sudo_users', [])
-        return user_id == admin_id or user_id in sudo_users 
-
     def _load_config(self):
         """Load config from database or create default"""
         config = self.config_collection.find_one({'_id': 'bot_config'})
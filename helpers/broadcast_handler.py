@@ -2,16 +2,21 @@ from telegram import Update
 from telegram.ext import ContextTypes
 import asyncio
 from datetime import datetime
-import os
+from config.database import relaxed_writes
+from .user_stats import UserStats
 
 class BroadcastHandler:
-    def __init__(self, db):
+    def __init__(self, db, bot_pool, acl):
         self.db = db
-        self.users_collection = db['users']
+        # Only blocked flags are written here
+        self.users_collection = relaxed_writes(db['users'])
+        self.stats = UserStats(db)
+        self.bot_pool = bot_pool
+        self.acl = acl
 
     async def broadcast_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /broadcast command"""
-        if not await self._is_admin(update.effective_user.id):
+        if not self.acl.is_admin(update.effective_user.id):
             await update.message.reply_text("You don't have permission to use this command!")
             return
 
@@ -43,35 +48,51 @@ class BroadcastHandler:
         status_msg = await update.message.reply_text("Broadcasting message...")
         
         # Get all users
-        users = list(self.users_collection.find({}))
-        total_users = self.users_collection.count_documents({})
-        successful = 0
-        failed = 0
+        users = list(self.users_collection.find({}, {"user_id": 1, "bots": 1}))
+        total_users = len(users)
+        progress = {'successful': 0, 'failed': 0}
 
+        # Each bot messages the users who started it, so slices run in parallel
+        slices = {}
         for user in users:
-            try:
-                await context.bot.send_message(
-                    chat_id=user['user_id'],
-                    text=broadcast_msg,
-                    parse_mode='HTML'
-                )
-                successful += 1
-                await asyncio.sleep(0.05)
-            except Exception as e:
-                failed += 1
-                if "blocked" in str(e).lower():
-                    self.users_collection.update_one(
-                        {"user_id": user['user_id']},
-                        {"$set": {"blocked": True}}
+            bot = self.bot_pool.bot_for_user(user['user_id'], user.get('bots'))
+            slices.setdefault(bot.token, (bot, []))[1].append(user)
+
+        async def send_slice(bot, slice_users):
+            for user in slice_users:
+                try:
+                    await self.bot_pool.acquire(bot)
+                    await bot.send_message(
+                        chat_id=user['user_id'],
+                        text=broadcast_msg,
+                        parse_mode='HTML'
                     )
+                    progress['successful'] += 1
+                except Exception as e:
+                    progress['failed'] += 1
+                    if "blocked" in str(e).lower():
+                        result = self.users_collection.update_one(
+                            {"user_id": user['user_id'], "blocked": {"$ne": True}},
+                            {"$set": {"blocked": True}}
+                        )
+                        if result.modified_count:
+                            self.stats.user_blocked()
+
+                done = progress['successful'] + progress['failed']
+                if done % 25 == 0:
+                    try:
+                        await status_msg.edit_text(
+                            f"Broadcasting...\n"
+                            f"Progress: {done}/{total_users}\n"
+                            f"Success: {progress['successful']}\n"
+                            f"Failed: {progress['failed']}"
+                        )
+                    except Exception:
+                        pass
 
-            if (successful + failed) % 25 == 0:
-                await status_msg.edit_text(
-                    f"Broadcasting...\n"
-                    f"Progress: {successful + failed}/{total_users}\n"
-                    f"Success: {successful}\n"
-                    f"Failed: {failed}"
-                )
+        await asyncio.gather(*(send_slice(bot, slice_users) for bot, slice_users in slices.values()))
+        successful = progress['successful']
+        failed = progress['failed']
 
         await status_msg.edit_text(
             f"✅ Broadcast completed!\n\n"
@@ -79,14 +100,3 @@ class BroadcastHandler:
             f"Successful: {successful}\n"
             f"Failed: {failed}"
         )
-
-    async def _is_admin(self, user_id: int) -> bool:
-        """Check if user is admin or sudo user"""
-        # Get admin ID from env
-        admin_id = int(os.getenv('ADMIN_ID', '0'))
-        
-        # Get sudo users from env
-        sudo_users = os.getenv('SUDO_USERS', '')
-        sudo_list = [int(id.strip()) for id in sudo_users.split(',') if id.strip()]
-        
-        return user_id == admin_id or user_id in sudo_list 
\ No newline at end of file
@@ -0,0 +1,223 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from telethon.utils import pack_bot_file_id
+from pymongo.errors import BulkWriteError
+from .task_supervisor import supervisor
+import asyncio
+import random
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ChannelIndexer:
+    def __init__(self, db, login_handler, batch_size: int = 1000, progress_interval: int = 5):
+        self.db = db
+        self.login_handler = login_handler
+        self.files_collection = db['files']
+        self.checkpoints_collection = db['index_checkpoints']
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.running = {}  # channel -> indexing task
+        # Each job walks a whole channel over one Telethon session; queue the rest
+        supervisor.add_group('indexer', limit=2)
+
+    def ensure_indexes(self):
+        try:
+            self.files_collection.create_index('media_id', sparse=True)
+        except Exception as e:
+            logger.error(f"Error creating indexer index: {str(e)}")
+
+    async def handle_index_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /index command"""
+        if not context.args:
+            await update.message.reply_text(
+                "Please provide a channel to index.\n"
+                "Example: /index @storagechannel or /index -1001234567890\n"
+                "Stop a running job with: /index stop @storagechannel"
+            )
+            return
+
+        if context.args[0] == 'stop' and len(context.args) > 1:
+            task = self.running.get(context.args[1])
+            if task:
+                task.cancel()
+                await update.message.reply_text("⏹ Indexing stopped. It will resume from the last checkpoint.")
+            else:
+                await update.message.reply_text("No indexing job is running for that channel.")
+            return
+
+        channel = context.args[0]
+        if channel in self.running:
+            await update.message.reply_text("This channel is already being indexed.")
+            return
+
+        if not await self.login_handler.ensure_connected():
+            await update.message.reply_text("Please /login first.")
+            return
+
+        status_msg = await update.message.reply_text(f"🔎 Indexing {channel}...")
+        # Run in the background so the bot keeps handling other updates
+        task = supervisor.spawn('indexer', self._run, channel, status_msg, name=channel)
+        self.running[channel] = task
+        task.add_done_callback(lambda _: self.running.pop(channel, None))
+
+    def _get_media_info(self, message):
+        """Extract file metadata from a Telethon message, or None if it has no file"""
+        if not message.file or not (message.document or message.photo):
+            return None
+
+        if message.photo:
+            file_type = 'photo'
+        elif message.video_note:
+            file_type = 'video_note'
+        elif message.voice:
+            file_type = 'voice'
+        elif message.video:
+            file_type = 'video'
+        elif message.audio:
+            file_type = 'audio'
+        else:
+            file_type = 'document'
+
+        media = message.photo or message.document
+        file_id = pack_bot_file_id(media)
+        if not file_id:
+            return None
+
+        return {
+            "file_id": file_id,
+            "file_code": str(abs(hash(file_id)))[:8],
+            "file_type": file_type,
+            "file_name": message.file.name,
+            "mime_type": message.file.mime_type,
+            "caption": message.message or None,
+            "media_id": media.id,
+            "source_chat_id": message.chat_id,
+            "source_message_id": message.id
+        }
+
+    def _write_page(self, channel: str, docs: list, last_message_id: int) -> int:
+        """Insert new files from one page and move the checkpoint forward"""
+        new_docs = []
+        if docs:
+            existing = {
+                doc['media_id'] for doc in self.files_collection.find(
+                    {"media_id": {"$in": [d['media_id'] for d in docs]}},
+                    {"media_id": 1}
+                )
+            }
+            new_docs = [d for d in docs if d['media_id'] not in existing]
+        if new_docs:
+            self._assign_codes(new_docs)
+            self._insert(new_docs)
+
+        self.checkpoints_collection.update_one(
+            {"_id": channel},
+            {"$set": {"last_message_id": last_message_id}},
+            upsert=True
+        )
+        return len(new_docs)
+
+    def _new_code(self) -> str:
+        return str(random.randrange(10 ** 7, 10 ** 8))
+
+    def _assign_codes(self, docs: list):
+        """Replace codes already used by another file or earlier in this page"""
+        taken = {
+            doc['file_code'] for doc in self.files_collection.find(
+                {"file_code": {"$in": [d['file_code'] for d in docs]}},
+                {"file_code": 1}
+            )
+        }
+        for doc in docs:
+            while doc['file_code'] in taken:
+                doc['file_code'] = self._new_code()
+            taken.add(doc['file_code'])
+
+    def _insert(self, docs: list, attempts: int = 5):
+        """insert_many, retrying documents whose code was taken in the meantime"""
+        for _ in range(attempts):
+            try:
+                self.files_collection.insert_many(docs, ordered=False)
+                return
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if not errors or any(error.get('code') != 11000 for error in errors):
+                    raise
+                docs = [docs[error['index']] for error in errors]
+                for doc in docs:
+                    doc.pop('_id', None)
+                    doc['file_code'] = self._new_code()
+        raise RuntimeError(f"Could not find free share codes for {len(docs)} files")
+
+    async def _run(self, channel: str, status_msg):
+        checkpoint = self.checkpoints_collection.find_one({"_id": channel}) or {}
+        min_id = checkpoint.get('last_message_id', 0)
+        client = self.login_handler.client
+
+        scanned = 0
+        indexed = 0
+        duplicates = 0
+        page = []
+        seen = set()
+        last_message_id = min_id
+        started = time.monotonic()
+        last_progress = started
+
+        async def flush():
+            nonlocal page, indexed, duplicates
+            inserted = await asyncio.to_thread(self._write_page, channel, page, last_message_id)
+            duplicates += len(page) - inserted
+            indexed += inserted
+            page = []
+
+        def progress_text(done: bool = False):
+            elapsed = max(time.monotonic() - started, 0.001)
+            return (
+                f"{'✅ Indexing complete' if done else '🔎 Indexing'}: {channel}\n\n"
+                f"Messages scanned: {scanned}\n"
+                f"Files indexed: {indexed}\n"
+                f"Duplicates skipped: {duplicates}\n"
+                f"Last message: {last_message_id}\n"
+                f"Speed: {scanned / elapsed:.0f} msg/s"
+            )
+
+        try:
+            entity = await client.get_entity(int(channel) if channel.lstrip('-').isdigit() else channel)
+            # Telethon fetches history in pages of 100 under the hood
+            async for message in client.iter_messages(entity, reverse=True, min_id=min_id, wait_time=1):
+                scanned += 1
+                last_message_id = message.id
+                info = self._get_media_info(message)
+                if info:
+                    if info['media_id'] in seen:
+                        duplicates += 1
+                    else:
+                        seen.add(info['media_id'])
+                        page.append(info)
+
+                if len(page) >= self.batch_size:
+                    await flush()
+
+                if time.monotonic() - last_progress >= self.progress_interval:
+                    last_progress = time.monotonic()
+                    try:
+                        await status_msg.edit_text(progress_text())
+                    except Exception:
+                        pass
+
+            await flush()
+            await status_msg.edit_text(progress_text(done=True))
+
+        except asyncio.CancelledError:
+            await flush()
+            await status_msg.edit_text(progress_text() + "\n\n⏹ Stopped.")
+            raise
+        except Exception as e:
+            logger.error(f"Error indexing {channel}: {str(e)}")
+            try:
+                await flush()
+            except Exception:
+                pass
+            await status_msg.edit_text(progress_text() + f"\n\n❌ Error: {str(e)}")
@@ -1,18 +1,23 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 import re
-import os
+from config.database import durable_writes
+import logging
+
+logger = logging.getLogger(__name__)
 
 class DeleteHandler:
-    def __init__(self, db, config):
+    def __init__(self, db, config, acl, ingest_journal):
         self.db = db
         self.config = config
-        self.files_collection = db['files']
-        self.batches_collection = db['batches']
+        self.acl = acl
+        self.ingest_journal = ingest_journal
+        self.files_collection = durable_writes(db['files'])
+        self.batches_collection = durable_writes(db['batches'])
     
     async def handle_delete(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /del command"""
-        if not await self._is_admin(update.effective_user.id):
+        if not self.acl.is_admin(update.effective_user.id):
             await update.message.reply_text("❌ You don't have permission to use this command!")
             return
             
@@ -38,7 +43,10 @@ class DeleteHandler:
             if code.startswith('batch_'):
                 # Delete batch
                 batch_code = code[6:]  # Remove 'batch_' prefix
-                batch = self.batches_collection.find_one({"batch_code": batch_code})
+                # Drop it from the journal too, or the next replay would bring it back
+                journaled = self.ingest_journal.lookup('batches', batch_code)
+                await self.ingest_journal.discard('batches', batch_code)
+                batch = self.batches_collection.find_one({"batch_code": batch_code}) or journaled
                 
                 if batch:
                     # Delete all files in the batch first
@@ -54,14 +62,15 @@ class DeleteHandler:
                     await update.message.reply_text("❌ Batch not found!")
             else:
                 # Delete single file
+                journaled = await self.ingest_journal.discard('files', code)
                 result = self.files_collection.delete_one({"file_code": code})
-                if result.deleted_count > 0:
+                if result.deleted_count > 0 or journaled:
                     await update.message.reply_text("✅ File deleted successfully!")
                 else:
                     await update.message.reply_text("❌ File not found!")
                     
         except Exception as e:
-            print(f"Error deleting: {str(e)}")
+            logger.error(f"Error deleting: {str(e)}")
             await update.message.reply_text("❌ Error deleting file/batch!")
     
     def _extract_code(self, link: str) -> str:
@@ -79,9 +88,3 @@ class DeleteHandler:
             return f"{prefix}{worker_match.group(2)}"
             
         return None
-    
-    async def _is_admin(self, user_id: int) -> bool:
-        """Check if user is admin"""
-        admin_id = int(os.getenv('ADMIN_ID', '0'))
-        sudo_users = self.config.get('sudo_users', [])
-        return user_id == admin_id or user_id in sudo_users 
\ No newline at end of file
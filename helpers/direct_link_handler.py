@@ -1,19 +1,31 @@
 from telegram import Update
 from telegram.ext import ContextTypes
+from .link_signer import LinkSigner, get_link_secret
+import base64
+import ipaddress
 import re
 import os
 import time
-import base64
+
+LINK_VALIDITY_HOURS = 6
 
 class DirectLinkHandler:
-    def __init__(self, config):
+    def __init__(self, config, signed: bool = False):
         self.config = config
         self.worker_url = os.getenv('WORKER_URL', '').rstrip('/')
+        # Signed links only work where DriveProxy serves them; otherwise keep the worker's format
+        self.signed = signed
+        # Direct links can be served by the bot's own web server instead of the worker
+        self.direct_link_url = (os.getenv('DIRECT_LINK_URL') or self.worker_url).rstrip('/')
+        self.signer = LinkSigner(get_link_secret())
 
     async def handle_direct_link_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /gdirect command"""
         if not context.args:
-            await update.message.reply_text("❌ Please provide a Google Drive link.")
+            await update.message.reply_text(
+                "❌ Please provide a Google Drive link.\n\n"
+                "Optional scope: hours=6 ip=1.2.3.4 range=0-1048575"
+            )
             return
 
         drive_link = context.args[0]
@@ -23,14 +35,68 @@ class DirectLinkHandler:
             await update.message.reply_text("❌ Invalid Google Drive link.")
             return
 
-        # Generate direct link with encoded driveId and timestamp
-        timestamp = int(time.time() * 1000)  # Current time in milliseconds
+        try:
+            hours, ip, byte_range = self._parse_scope(context.args[1:])
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {str(e)}")
+            return
+
+        if not self.signed:
+            if context.args[1:]:
+                await update.message.reply_text("❌ Scoped links need SERVICE_ACCOUNTS to be set.")
+                return
+            await update.message.reply_text(
+                f"✅ Here is your direct link (valid for {LINK_VALIDITY_HOURS} hours):\n{self._legacy_link(file_id)}"
+            )
+            return
+
+        # Generate a signed direct link carrying the drive id, expiry and scope
+        expires_at = int(time.time() + hours * 3600)
+        token = self.signer.sign(file_id, expires_at, ip=ip, byte_range=byte_range)
+        direct_link = f"{self.direct_link_url}/gdirect/{token}"
+
+        scope = ""
+        if ip:
+            scope += f"\nOnly for IP: {ip}"
+        if byte_range:
+            scope += f"\nBytes: {byte_range[0]}-{byte_range[1]}"
+        await update.message.reply_text(
+            f"✅ Here is your direct link (valid for {hours} hour{'s' if hours != 1 else ''}):\n{direct_link}{scope}"
+        )
+
+    def _legacy_link(self, file_id: str) -> str:
+        """Unsigned link in the format worker.js decodes itself: drive id and creation time in ms"""
+        timestamp = int(time.time() * 1000)
         encoded_drive_id = base64.urlsafe_b64encode(file_id.encode()).decode().rstrip('=')
         encoded_timestamp = base64.urlsafe_b64encode(str(timestamp).encode()).decode().rstrip('=')
-        direct_link = f"{self.worker_url}/gdirect/{encoded_drive_id}/{encoded_timestamp}"
-        await update.message.reply_text(f"✅ Here is your direct link (valid for 6 hours):\n{direct_link}")
+        return f"{self.worker_url}/gdirect/{encoded_drive_id}/{encoded_timestamp}"
+
+    def _parse_scope(self, args):
+        """Parse optional hours=, ip= and range= arguments"""
+        hours = LINK_VALIDITY_HOURS
+        ip = None
+        byte_range = None
+        for arg in args:
+            key, _, value = arg.partition('=')
+            if key == 'hours':
+                if not value.isdigit() or not 1 <= int(value) <= 168:
+                    raise ValueError("hours must be between 1 and 168.")
+                hours = int(value)
+            elif key == 'ip':
+                try:
+                    ip = str(ipaddress.ip_address(value))
+                except ValueError:
+                    raise ValueError("Invalid IP address.")
+            elif key == 'range':
+                match = re.fullmatch(r'(\d+)-(\d+)', value)
+                if not match or int(match.group(1)) > int(match.group(2)):
+                    raise ValueError("range must look like 0-1048575.")
+                byte_range = (int(match.group(1)), int(match.group(2)))
+            else:
+                raise ValueError(f"Unknown option: {arg}")
+        return hours, ip, byte_range
 
     def _extract_file_id(self, link):
         """Extract file ID from Google Drive link"""
         match = re.search(r'/file/d/([a-zA-Z0-9_-]+)', link)
-        return match.group(1) if match else None
\ No newline at end of file
+        return match.group(1) if match else None
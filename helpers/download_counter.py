@@ -0,0 +1,149 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from pymongo import UpdateOne
+from collections import Counter
+from datetime import datetime, timedelta
+from config.database import relaxed_writes, secondary_reads
+from .task_supervisor import supervisor
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DownloadCounter:
+    def __init__(self, db, flush_interval: int = 5):
+        self.db = db
+        # Download counts are analytics; losing a few on failover is fine
+        self.files_collection = relaxed_writes(db['files'])
+        self.batches_collection = relaxed_writes(db['batches'])
+        self.stats_collection = secondary_reads(relaxed_writes(db['download_stats']))
+        self.flush_interval = flush_interval
+        self.pending = Counter()  # code -> downloads not yet written
+        self._flush_task = None
+
+    def record(self, code: str):
+        """Count a delivered file or batch (flushed in the background)"""
+        self.pending[code] += 1
+
+    def start(self):
+        """Start the periodic flush loop"""
+        if not self._flush_task:
+            self._flush_task = supervisor.spawn('loops', self._flush_loop)
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Write pending counts as one bulk $inc per collection"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, Counter()
+        try:
+            await asyncio.to_thread(self._write, pending, datetime.now())
+        except Exception as e:
+            logger.error(f"Error flushing download counts: {str(e)}")
+            # Keep the counts for the next round
+            self.pending.update(pending)
+
+    def _write(self, pending: Counter, now: datetime):
+        file_ops = []
+        batch_ops = []
+        for code, count in pending.items():
+            if code.startswith('batch_'):
+                batch_ops.append(UpdateOne({"batch_code": code[6:]}, {"$inc": {"download_count": count}}))
+            else:
+                file_ops.append(UpdateOne({"file_code": code}, {"$inc": {"download_count": count}}))
+
+        if file_ops:
+            self.files_collection.bulk_write(file_ops, ordered=False)
+        if batch_ops:
+            self.batches_collection.bulk_write(batch_ops, ordered=False)
+
+        # Hourly and daily rollups keep one document per bucket
+        increments = {f"counts.{code}": count for code, count in pending.items()}
+        increments['total'] = sum(pending.values())
+        rollup_ops = []
+        for period, bucket in self._buckets(now):
+            rollup_ops.append(UpdateOne(
+                {"_id": self._rollup_id(period, bucket)},
+                {
+                    "$inc": increments,
+                    "$setOnInsert": {"period": period, "bucket": bucket}
+                },
+                upsert=True
+            ))
+        self.stats_collection.bulk_write(rollup_ops, ordered=False)
+
+    def _buckets(self, now: datetime):
+        return [
+            ('hour', now.replace(minute=0, second=0, microsecond=0)),
+            ('day', now.replace(hour=0, minute=0, second=0, microsecond=0))
+        ]
+
+    def _rollup_id(self, period: str, bucket: datetime) -> str:
+        if period == 'hour':
+            return f"hour:{bucket.strftime('%Y%m%d%H')}"
+        return f"day:{bucket.strftime('%Y%m%d')}"
+
+    def get_top(self, period: str = 'day', limit: int = 10):
+        """Return the most downloaded codes from the precomputed rollups"""
+        now = datetime.now()
+        if period == 'hour':
+            ids = [self._rollup_id('hour', now)]
+        elif period == 'week':
+            ids = [self._rollup_id('day', now - timedelta(days=i)) for i in range(7)]
+        else:
+            ids = [self._rollup_id('day', now)]
+
+        totals = Counter()
+        for doc in self.stats_collection.find({"_id": {"$in": ids}}, {"counts": 1}):
+            totals.update(doc.get('counts', {}))
+        return totals.most_common(limit)
+
+    async def handle_top_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /top command"""
+        period = context.args[0].lower() if context.args else 'day'
+        if period not in ('hour', 'day', 'week'):
+            await update.message.reply_text("Usage: /top [hour|day|week]")
+            return
+
+        top = self.get_top(period)
+        if not top:
+            await update.message.reply_text(f"No downloads recorded for this {period} yet.")
+            return
+
+        names = self._get_names([code for code, _ in top])
+        text = f"🔥 <b>Top downloads ({period})</b>\n\n"
+        for i, (code, count) in enumerate(top):
+            text += f"{i+1}. <code>{code}</code> - {names.get(code, 'Unknown')} ({count})\n"
+
+        await update.message.reply_text(text, parse_mode='HTML')
+
+    def _get_names(self, codes: list) -> dict:
+        """Look up display names for a handful of codes"""
+        names = {}
+        file_codes = [c for c in codes if not c.startswith('batch_')]
+        batch_codes = [c[6:] for c in codes if c.startswith('batch_')]
+        if file_codes:
+            for doc in self.files_collection.find(
+                {"file_code": {"$in": file_codes}},
+                {"file_code": 1, "file_name": 1, "caption": 1}
+            ):
+                names[doc['file_code']] = doc.get('caption') or doc.get('file_name') or 'No Name'
+        if batch_codes:
+            for doc in self.batches_collection.find(
+                {"batch_code": {"$in": batch_codes}},
+                {"batch_code": 1, "files": {"$slice": 1}}
+            ):
+                first = doc.get('files', [{}])[0] if doc.get('files') else {}
+                names[f"batch_{doc['batch_code']}"] = f"Batch: {first.get('caption') or first.get('file_name') or 'No Name'}"
+        return names
@@ -0,0 +1,249 @@
+from aiohttp import web
+from urllib.parse import quote
+from .link_signer import InvalidLink, LinkSigner
+import aiohttp
+import asyncio
+import base64
+import json
+import os
+import re
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DRIVE_API_URL = 'https://www.googleapis.com/drive/v3'
+TOKEN_URL = 'https://oauth2.googleapis.com/token'
+DRIVE_SCOPE = 'https://www.googleapis.com/auth/drive.readonly'
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def load_service_accounts(path: str) -> list:
+    """Load service accounts from a JSON file (object or list) or a directory of JSON files"""
+    if os.path.isdir(path):
+        accounts = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.json'):
+                with open(os.path.join(path, name)) as f:
+                    accounts.append(json.load(f))
+        return accounts
+    with open(path) as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+class DriveProxy:
+    def __init__(self, service_accounts: list, signer: LinkSigner, api_url: str = DRIVE_API_URL,
+                 token_url: str = TOKEN_URL, metadata_ttl: int = 300, token_refresh_margin: int = 300,
+                 trust_forwarded: bool = False):
+        if not service_accounts:
+            raise ValueError("At least one service account is required")
+        self.service_accounts = service_accounts
+        self.signer = signer
+        self.trust_forwarded = trust_forwarded  # Use CF-Connecting-IP / X-Forwarded-For when behind a proxy
+        self.api_url = api_url.rstrip('/')
+        self.token_url = token_url
+        self.metadata_ttl = metadata_ttl
+        self.token_refresh_margin = token_refresh_margin
+        self.current_account = 0
+        self.tokens = {}  # account index -> (access_token, expires_at)
+        self.token_locks = [asyncio.Lock() for _ in service_accounts]
+        self.metadata_cache = {}  # drive id -> (expires_at, metadata)
+        self.session = None
+
+    def setup(self, app: web.Application):
+        """Register the /gdirect route (GET and HEAD) on the web app"""
+        app.router.add_get('/gdirect/{token}', self.handle_download)
+        app.on_cleanup.append(self._close_session)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if not self.session or self.session.closed:
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=60)
+            self.session = aiohttp.ClientSession(timeout=timeout, auto_decompress=False)
+        return self.session
+
+    async def _close_session(self, app=None):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    def _sign_jwt(self, account: dict) -> str:
+        # Only needed when the proxy is enabled, so import lazily
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        now = int(time.time())
+        header = {'alg': 'RS256', 'typ': 'JWT'}
+        claim = {
+            'iss': account['client_email'],
+            'scope': DRIVE_SCOPE,
+            'aud': self.token_url,
+            'exp': now + 3600,
+            'iat': now
+        }
+        signing_input = f"{_b64url(json.dumps(header).encode())}.{_b64url(json.dumps(claim).encode())}"
+        key = serialization.load_pem_private_key(account['private_key'].encode(), password=None)
+        signature = key.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+        return f"{signing_input}.{_b64url(signature)}"
+
+    async def get_access_token(self, index: int) -> str:
+        """Return a cached access token for an account, refreshing it before expiry"""
+        cached = self.tokens.get(index)
+        if cached and cached[1] - self.token_refresh_margin > time.time():
+            return cached[0]
+
+        async with self.token_locks[index]:
+            # Another request may have refreshed it while we waited
+            cached = self.tokens.get(index)
+            if cached and cached[1] - self.token_refresh_margin > time.time():
+                return cached[0]
+
+            assertion = self._sign_jwt(self.service_accounts[index])
+            async with self._get_session().post(self.token_url, data={
+                'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
+                'assertion': assertion
+            }) as response:
+                data = await response.json(content_type=None)
+
+            if not data.get('access_token'):
+                raise RuntimeError(f"Failed to get access token: {data}")
+
+            self.tokens[index] = (data['access_token'], time.time() + int(data.get('expires_in', 3600)))
+            return data['access_token']
+
+    async def _open(self, url: str, headers: dict = None):
+        """Open an upstream request, rotating through accounts at most once each on quota errors"""
+        for attempt in range(len(self.service_accounts)):
+            index = (self.current_account + attempt) % len(self.service_accounts)
+            token = await self.get_access_token(index)
+            request_headers = {'Authorization': f"Bearer {token}", **(headers or {})}
+            response = await self._get_session().get(url, headers=request_headers)
+
+            if response.status == 401:
+                # Token revoked early: drop it so the next use mints a new one
+                self.tokens.pop(index, None)
+            if response.status in (401, 403, 429):
+                response.release()
+                logger.warning(f"Service account {index} got {response.status}, switching to next account...")
+                continue
+
+            self.current_account = index
+            return response
+
+        return None
+
+    async def get_metadata(self, drive_id: str):
+        """Return (status, metadata) for a file, cached per drive id"""
+        cached = self.metadata_cache.get(drive_id)
+        if cached and cached[0] > time.monotonic():
+            return 200, cached[1]
+
+        url = f"{self.api_url}/files/{quote(drive_id)}?supportsAllDrives=true&fields=name,mimeType,size"
+        response = await self._open(url)
+        if response is None:
+            return 429, None
+
+        async with response:
+            if response.status != 200:
+                return response.status, None
+            metadata = await response.json(content_type=None)
+
+        if len(self.metadata_cache) >= 10000:
+            self.metadata_cache.clear()
+        self.metadata_cache[drive_id] = (time.monotonic() + self.metadata_ttl, metadata)
+        return 200, metadata
+
+    def _client_ip(self, request: web.Request) -> str:
+        if self.trust_forwarded:
+            # Cloudflare overwrites this header, so clients can't set it
+            if request.headers.get('CF-Connecting-IP'):
+                return request.headers['CF-Connecting-IP'].strip()
+            # Clients can send their own X-Forwarded-For; only the entry our proxy appended,
+            # the right-most one, is trustworthy
+            hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+            if hops:
+                return hops[-1]
+        return request.remote
+
+    def _scoped_range(self, range_header: str, scope: list):
+        """Return the Range to request upstream, or None if it falls outside the signed scope"""
+        start, end = scope
+        if not range_header:
+            return f"bytes={start}-{end}"
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', range_header.strip())
+        if not match:
+            return None
+        requested_start = int(match.group(1))
+        requested_end = int(match.group(2)) if match.group(2) else end
+        if requested_start < start or requested_end > end:
+            return None
+        return f"bytes={requested_start}-{requested_end}"
+
+    async def handle_download(self, request: web.Request):
+        """Validate the signed token, then stream the Drive file"""
+        try:
+            data = self.signer.verify(request.match_info['token'], self._client_ip(request))
+        except InvalidLink as e:
+            return web.Response(text=str(e), status=403)
+
+        range_header = request.headers.get('Range')
+        if data.get('r'):
+            range_header = self._scoped_range(range_header, data['r'])
+            if not range_header:
+                return web.Response(text='Requested range is outside this link', status=416)
+
+        return await self.stream_file(request, data['d'], range_header)
+
+    async def stream_file(self, request: web.Request, drive_id: str, range_header: str = None):
+        try:
+            status, metadata = await self.get_metadata(drive_id)
+        except Exception as e:
+            logger.error(f"Error getting Drive metadata: {str(e)}")
+            return web.Response(text='Failed to get file metadata', status=502)
+
+        if status == 429:
+            return web.Response(text='All service accounts are rate limited', status=503, headers={'Retry-After': '60'})
+        if status != 200:
+            return web.Response(text=f"Failed to get file metadata: {status}", status=status)
+
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': metadata.get('mimeType') or 'application/octet-stream',
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(metadata.get('name') or drive_id)}",
+            'Accept-Ranges': 'bytes'
+        }
+
+        if request.method == 'HEAD':
+            if metadata.get('size'):
+                headers['Content-Length'] = str(metadata['size'])
+            return web.Response(status=200, headers=headers)
+
+        url = f"{self.api_url}/files/{quote(drive_id)}?alt=media&supportsAllDrives=true"
+        upstream_headers = {}
+        if range_header:
+            upstream_headers['Range'] = range_header
+
+        try:
+            upstream = await self._open(url, upstream_headers)
+        except Exception as e:
+            logger.error(f"Error opening Drive download: {str(e)}")
+            return web.Response(text='Drive request failed', status=502)
+
+        if upstream is None:
+            return web.Response(text='All service accounts are rate limited', status=503, headers={'Retry-After': '60'})
+
+        async with upstream:
+            if upstream.status not in (200, 206):
+                return web.Response(text=f"Drive API error: {upstream.status}", status=upstream.status)
+
+            for name in ('Content-Length', 'Content-Range'):
+                if upstream.headers.get(name):
+                    headers[name] = upstream.headers[name]
+
+            response = web.StreamResponse(status=upstream.status, headers=headers)
+            await response.prepare(request)
+            # iter_any hands over buffers as they arrive, without re-chunking.
+            # If the client goes away, leaving this block closes the Drive download.
+            async for chunk in upstream.content.iter_any():
+                await response.write(chunk)
+            await response.write_eof()
+            return response
@@ -0,0 +1,96 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SentMessage:
+    """A message sent with copy_message, which only returns the new message id"""
+    def __init__(self, bot, chat_id: int, message_id: int):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    def get_bot(self):
+        return self.bot
+
+    async def delete(self):
+        return await self.bot.delete_message(chat_id=self.chat_id, message_id=self.message_id)
+
+class FileSender:
+    def __init__(self, config, bot_pool):
+        self.config = config
+        self.bot_pool = bot_pool
+        # Channel every bot can read; lets delivery bots copy files the primary bot received
+        storage_channel = os.getenv('STORAGE_CHANNEL')
+        self.storage_channel = int(storage_channel) if storage_channel else None
+
+    def format_caption(self, caption: str) -> str:
+        prefix_name = self.config.get('prefix_name', '@CinemazBD')
+
+        # Format caption
+        if caption:
+            caption = f"{prefix_name} - {caption}"  # Add prefix with hyphen
+        else:
+            caption = f"{prefix_name}\n<b>Here's your file!</b>"
+
+        # Make the whole caption bold
+        return f"<b>{caption}</b>"
+
+    async def store(self, message) -> dict:
+        """Copy an incoming file to the storage channel and return its location"""
+        if not self.storage_channel:
+            return {}
+        try:
+            stored = await message.copy(chat_id=self.storage_channel)
+            return {"storage_chat_id": self.storage_channel, "storage_message_id": stored.message_id}
+        except Exception as e:
+            logger.error(f"Error copying file to storage channel: {str(e)}")
+            return {}
+
+    def _copy_source(self, file_info: dict):
+        if file_info.get('storage_message_id'):
+            return file_info['storage_chat_id'], file_info['storage_message_id']
+        if file_info.get('source_message_id'):
+            return file_info['source_chat_id'], file_info['source_message_id']
+        return None
+
+    def _needs_copy(self, bot, file_info: dict) -> bool:
+        # Indexed files carry a file_id packed from the user session, which no bot received
+        return not self.bot_pool.is_primary(bot) or bool(file_info.get('source_message_id'))
+
+    def primary_only(self, file_info: dict) -> bool:
+        """Files with no copy source, like ones uploaded before STORAGE_CHANNEL was set, only the primary bot can send"""
+        return self._copy_source(file_info) is None
+
+    def can_send(self, bot, file_info: dict) -> bool:
+        """file_ids only work for the bot that received them; other bots need a copy source"""
+        return not self._needs_copy(bot, file_info) or self._copy_source(file_info) is not None
+
+    def primary_link(self, code: str) -> str:
+        return f"https://t.me/{self.bot_pool.primary.username}?start={code}"
+
+    async def send_file(self, bot, chat_id: int, file_info: dict):
+        """Send a stored file with the configured caption under the bot's rate limit"""
+        caption = self.format_caption(file_info.get('caption', ''))
+        await self.bot_pool.acquire(bot)
+
+        if self._needs_copy(bot, file_info):
+            from_chat_id, message_id = self._copy_source(file_info)
+            copied = await bot.copy_message(
+                chat_id=chat_id,
+                from_chat_id=from_chat_id,
+                message_id=message_id,
+                caption=caption,
+                parse_mode='HTML'
+            )
+            return SentMessage(bot, chat_id, copied.message_id)
+
+        file_type = file_info.get('file_type', 'document')
+        if file_type == 'photo':
+            return await bot.send_photo(chat_id=chat_id, photo=file_info['file_id'], caption=caption, parse_mode='HTML')
+        elif file_type == 'video':
+            return await bot.send_video(chat_id=chat_id, video=file_info['file_id'], caption=caption, parse_mode='HTML')
+        elif file_type == 'audio':
+            return await bot.send_audio(chat_id=chat_id, audio=file_info['file_id'], caption=caption, parse_mode='HTML')
+        else:
+            return await bot.send_document(chat_id=chat_id, document=file_info['file_id'], caption=caption, parse_mode='HTML')
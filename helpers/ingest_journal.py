@@ -0,0 +1,263 @@
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from config.database import durable_writes
+from .task_supervisor import supervisor
+import asyncio
+import glob
+import json
+import os
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Collection -> field holding the share code
+CODE_FIELDS = {'files': 'file_code', 'batches': 'batch_code'}
+
+class IngestJournal:
+    """Local append-only log of new files and batches, replayed to Mongo in bulk"""
+    def __init__(self, db, path: str, shared_path: str = None, has_peers: bool = False, sync_window: float = 0.05,
+                 replay_interval: int = 2, batch_size: int = 500):
+        self.db = db
+        self.path = path
+        # Journals of other processes are named shared_path plus a suffix (one per worker)
+        self.shared_path = shared_path or path
+        self.has_peers = has_peers  # Only worker mode has other journals to look at
+        self.sync_window = sync_window  # Appends arriving within this window share one fsync
+        self.replay_interval = replay_interval
+        self.batch_size = batch_size
+        self.pending = {}  # (collection, code) -> document Mongo hasn't acknowledged yet
+        self.unsynced = []  # (line, future) waiting for the next fsync
+        self.file_lock = asyncio.Lock()
+        self.has_unsynced = asyncio.Event()
+        self._sync_task = None
+        self._replay_task = None
+        self._peer_state = None  # (path, mtime, size) of the peer journals last read
+        self._peer_pending = {}
+        for key, doc in self._read(self.path):
+            self.pending[key] = doc
+        if self.pending:
+            logger.info(f"Ingest journal has {len(self.pending)} entries to replay")
+
+    def _read(self, path: str):
+        """Entries in a journal file, oldest first"""
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line from a crash mid-write
+                    yield (entry['collection'], entry['code']), entry['doc']
+        except FileNotFoundError:
+            pass
+
+    def _peer_paths(self) -> list:
+        paths = glob.glob(glob.escape(self.shared_path) + '*')
+        return sorted(path for path in paths if path != self.path and not path.endswith('.tmp'))
+
+    def adopt_peers(self):
+        """Take over the journals of other processes, e.g. after WORKERS changed.
+        Only call this while no other process is running."""
+        peers = self._peer_paths()
+        adopted = 0
+        for path in peers:
+            for key, doc in self._read(path):
+                if key not in self.pending:
+                    self.pending[key] = doc
+                    adopted += 1
+        if not peers:
+            return
+        # Make them ours on disk before removing the originals
+        self._rewrite(''.join(self._line(collection, code, doc) for (collection, code), doc in self.pending.items()))
+        for path in peers:
+            os.remove(path)
+        logger.info(f"Adopted {adopted} entries from {len(peers)} other ingest journals")
+
+    def lookup(self, collection: str, code: str):
+        """Return a document that is journaled but not yet in Mongo"""
+        return self.pending.get((collection, code))
+
+    def lookup_anywhere(self, collection: str, code: str):
+        """Like lookup(), but also check the journals of the other worker processes"""
+        doc = self.lookup(collection, code)
+        if doc is not None or not self.has_peers:
+            return doc
+        paths = self._peer_paths()
+        state = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            state.append((path, stat.st_mtime_ns, stat.st_size))
+        # Peer journals are usually empty or gone, so only re-read them when they change
+        if state != self._peer_state:
+            self._peer_state = state
+            self._peer_pending = {key: doc for path, _, _ in state for key, doc in self._read(path)}
+        return self._peer_pending.get((collection, code))
+
+    async def discard(self, collection: str, code: str) -> bool:
+        """Drop a journaled document so a later replay doesn't insert it. Returns True if it was pending."""
+        if self.pending.pop((collection, code), None) is None:
+            return False
+        await self.compact()
+        return True
+
+    def ensure_indexes(self):
+        """Replay upserts and link lookups go by share code"""
+        for collection, field in CODE_FIELDS.items():
+            try:
+                self.db[collection].create_index(field, unique=True)
+            except OperationFailure as e:
+                # Older data can hold duplicate codes; still index the lookups
+                logger.warning(f"Creating a non-unique {collection}.{field} index: {str(e)}")
+                self.db[collection].create_index(field)
+
+    def _line(self, collection: str, code: str, doc: dict) -> str:
+        return json.dumps({'collection': collection, 'code': code, 'doc': doc}) + '\n'
+
+    def new_code(self) -> str:
+        return str(random.randrange(10 ** 7, 10 ** 8))
+
+    def _free_code(self, collection: str) -> str:
+        """A share code no journaled or stored document uses"""
+        while True:
+            code = self.new_code()
+            if (collection, code) in self.pending:
+                continue
+            if self.db[collection].find_one({CODE_FIELDS[collection]: code}, {"_id": 1}) is None:
+                return code
+
+    async def append(self, collection: str, doc: dict) -> str:
+        """Give a new document a free share code and durably record it; returns the code
+        once it is on disk"""
+        code = await asyncio.to_thread(self._free_code, collection)
+        doc[CODE_FIELDS[collection]] = code
+        self.pending[(collection, code)] = doc
+        line = self._line(collection, code, doc)
+        future = asyncio.get_running_loop().create_future()
+        self.unsynced.append((line, future))
+        self.has_unsynced.set()
+        await future
+        return code
+
+    def start(self):
+        """Start the fsync and replay loops"""
+        if not self._sync_task:
+            self._sync_task = supervisor.spawn('loops', self._sync_loop)
+            self._replay_task = supervisor.spawn('loops', self._replay_loop)
+
+    async def stop(self):
+        """Sync what is buffered and try one last replay; the rest stays on disk"""
+        for task in (self._sync_task, self._replay_task):
+            if task:
+                task.cancel()
+        self._sync_task = self._replay_task = None
+        await self.sync()
+        await self.replay()
+
+    async def _sync_loop(self):
+        while True:
+            await self.has_unsynced.wait()
+            await asyncio.sleep(self.sync_window)
+            await self.sync()
+
+    async def sync(self):
+        """Write and fsync all buffered appends at once (group commit)"""
+        self.has_unsynced.clear()
+        if not self.unsynced:
+            return
+        batch, self.unsynced = self.unsynced, []
+        try:
+            async with self.file_lock:
+                await asyncio.to_thread(self._write, ''.join(line for line, _ in batch))
+        except OSError as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for _, future in batch:
+            future.set_result(None)
+
+    def _write(self, data: str):
+        with open(self.path, 'a') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _replay_loop(self):
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            await self.replay()
+
+    async def replay(self):
+        """Upsert pending documents into Mongo, then drop them from the journal"""
+        if not self.pending:
+            return
+        entries = list(self.pending.items())[:self.batch_size]
+        try:
+            conflicts = await asyncio.to_thread(self._upsert, entries)
+        except Exception as e:
+            logger.error(f"Ingest journal replay failed, {len(self.pending)} entries kept: {str(e)}")
+            return
+        for key, doc in entries:
+            if self.pending.get(key) is doc:
+                del self.pending[key]
+        for (collection, code), doc in conflicts:
+            # Another process stored a different document under this code first; keep ours under
+            # a new code. Links already handed out for the old code now open the other document.
+            new_code = await asyncio.to_thread(self._free_code, collection)
+            doc[CODE_FIELDS[collection]] = new_code
+            self.pending[(collection, new_code)] = doc
+            logger.error(f"Share code {code} in {collection} was taken by another document, re-coded as {new_code}")
+        await self.compact()
+
+    def _same(self, collection: str, doc: dict, stored: dict) -> bool:
+        if collection == 'batches':
+            return [f.get('file_id') for f in doc.get('files', [])] == [f.get('file_id') for f in stored.get('files', [])]
+        return doc.get('file_id') == stored.get('file_id')
+
+    def _upsert(self, entries: list) -> list:
+        """Upsert entries and return the ones whose code already holds a different document"""
+        by_collection = {}
+        for (collection, code), doc in entries:
+            by_collection.setdefault(collection, []).append(((collection, code), doc))
+        conflicts = []
+        for collection, collection_entries in by_collection.items():
+            field = CODE_FIELDS[collection]
+            # $setOnInsert makes a repeated replay a no-op
+            ops = [UpdateOne({field: code}, {'$setOnInsert': doc}, upsert=True) for (_, code), doc in collection_entries]
+            result = durable_writes(self.db[collection]).bulk_write(ops, ordered=False)
+            matched = [entry for i, entry in enumerate(collection_entries) if i not in result.upserted_ids]
+            if not matched:
+                continue
+            stored = {
+                doc[field]: doc for doc in durable_writes(self.db[collection]).find(
+                    {field: {"$in": [code for (_, code), _ in matched]}}
+                )
+            }
+            conflicts += [
+                (key, doc) for key, doc in matched
+                if key[1] in stored and not self._same(collection, doc, stored[key[1]])
+            ]
+        return conflicts
+
+    async def compact(self):
+        """Rewrite the journal with only the entries Mongo hasn't acknowledged"""
+        # Finish buffered appends first so the rewrite can't drop them
+        await self.sync()
+        async with self.file_lock:
+            lines = [self._line(collection, code, doc) for (collection, code), doc in self.pending.items()]
+            await asyncio.to_thread(self._rewrite, ''.join(lines))
+
+    def _rewrite(self, data: str):
+        if not data:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,185 @@
+from telegram import (
+    Update,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedAudio,
+    InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultCachedVideo,
+    InlineQueryResultCachedVoice,
+    InputTextMessageContent
+)
+from telegram.ext import ContextTypes
+from pymongo import TEXT
+from config.database import secondary_reads
+from .task_supervisor import supervisor
+import asyncio
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class InlineHandler:
+    def __init__(self, db, config, cache_ttl: int = 300, page_size: int = 20, max_results: int = 50):
+        self.db = db
+        self.config = config
+        # Read-only, and results are cached for cache_ttl anyway
+        self.files_collection = secondary_reads(db['files'])
+        self.batches_collection = secondary_reads(db['batches'])
+        self.cache_ttl = cache_ttl
+        self.page_size = page_size
+        self.max_results = max_results
+        self.worker_url = os.getenv('WORKER_URL', '').rstrip('/')
+        self.cache = {}  # normalized query -> (expires_at, results)
+        self.inflight = {}  # normalized query -> task fetching it
+        # Lookups run in threads; don't let a burst of queries take the whole pool
+        supervisor.add_group('inline', limit=8)
+
+    def ensure_indexes(self):
+        """Create the text indexes used for inline search"""
+        try:
+            self.files_collection.create_index(
+                [('file_name', TEXT), ('caption', TEXT)],
+                name='files_text'
+            )
+            self.batches_collection.create_index(
+                [('files.file_name', TEXT), ('files.caption', TEXT)],
+                name='batches_text'
+            )
+        except Exception as e:
+            logger.error(f"Error creating inline search indexes: {str(e)}")
+
+    def _normalize(self, query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    async def get_results(self, query: str) -> list:
+        """Return cached results, hitting Mongo at most once per TTL per query"""
+        key = self._normalize(query)
+        cached = self.cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        # Concurrent requests for the same query share one lookup
+        task = self.inflight.get(key)
+        if not task:
+            task = supervisor.spawn('inline', asyncio.to_thread, self._fetch, key, name='fetch')
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        results = await task
+
+        self.cache[key] = (time.monotonic() + self.cache_ttl, results)
+        self._evict_expired()
+        return results
+
+    def _evict_expired(self):
+        if len(self.cache) < 1000:
+            return
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self.cache.items() if expires <= now]:
+            del self.cache[key]
+
+    def _fetch(self, query: str) -> list:
+        projection = {"score": {"$meta": "textScore"}}
+        text_query = {"$text": {"$search": query}}
+
+        files = self.files_collection.find(
+            text_query,
+            {**projection, "file_id": 1, "file_code": 1, "file_type": 1, "file_name": 1, "caption": 1,
+             "source_message_id": 1}
+        ).sort([("score", {"$meta": "textScore"})]).limit(self.max_results)
+        batches = self.batches_collection.find(
+            text_query,
+            {**projection, "batch_code": 1, "files.file_name": 1, "files.caption": 1}
+        ).sort([("score", {"$meta": "textScore"})]).limit(self.max_results)
+
+        results = [{'kind': 'file', **doc} for doc in files]
+        results += [{'kind': 'batch', **doc} for doc in batches]
+        results.sort(key=lambda r: r.get('score', 0), reverse=True)
+        return results[:self.max_results]
+
+    async def handle_inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle inline queries: @bot <title>"""
+        inline_query = update.inline_query
+        query = inline_query.query.strip()
+        if not query:
+            await inline_query.answer([], cache_time=self.cache_ttl)
+            return
+
+        try:
+            offset = int(inline_query.offset or 0)
+        except ValueError:
+            offset = 0
+
+        try:
+            results = await self.get_results(query)
+        except Exception as e:
+            logger.error(f"Error in inline search: {str(e)}")
+            await inline_query.answer([], cache_time=5)
+            return
+
+        page = results[offset:offset + self.page_size]
+        next_offset = str(offset + self.page_size) if offset + self.page_size < len(results) else ''
+
+        await inline_query.answer(
+            [self._build_result(doc) for doc in page],
+            cache_time=self.cache_ttl,
+            next_offset=next_offset
+        )
+
+    def _format_caption(self, caption: str) -> str:
+        prefix_name = self.config.get('prefix_name', '@CinemazBD')
+        if caption:
+            caption = f"{prefix_name} - {caption}"
+        else:
+            caption = f"{prefix_name}\n<b>Here's your file!</b>"
+        return f"<b>{caption}</b>"
+
+    def _build_result(self, doc: dict):
+        result_id = str(doc['_id'])
+
+        if doc['kind'] == 'batch':
+            files = doc.get('files', [])
+            first = files[0] if files else {}
+            title = first.get('caption') or first.get('file_name') or 'Batch'
+            link = f"{self.worker_url}/batch_{doc['batch_code']}"
+            return InlineQueryResultArticle(
+                id=result_id,
+                title=f"📦 {title}",
+                description=f"{len(files)} files",
+                input_message_content=InputTextMessageContent(f"📦 {title}\n{link}")
+            )
+
+        title = doc.get('caption') or doc.get('file_name') or 'No Name'
+        caption = self._format_caption(doc.get('caption'))
+        file_type = doc.get('file_type', 'document')
+        if doc.get('source_message_id'):
+            # Indexed files carry a file_id no bot can send, and one invalid result fails the whole answer
+            file_type = None
+
+        if file_type == 'photo':
+            return InlineQueryResultCachedPhoto(
+                id=result_id, photo_file_id=doc['file_id'], title=title, caption=caption, parse_mode='HTML'
+            )
+        elif file_type == 'video':
+            return InlineQueryResultCachedVideo(
+                id=result_id, video_file_id=doc['file_id'], title=title, caption=caption, parse_mode='HTML'
+            )
+        elif file_type == 'audio':
+            return InlineQueryResultCachedAudio(
+                id=result_id, audio_file_id=doc['file_id'], caption=caption, parse_mode='HTML'
+            )
+        elif file_type == 'voice':
+            return InlineQueryResultCachedVoice(
+                id=result_id, voice_file_id=doc['file_id'], title=title, caption=caption, parse_mode='HTML'
+            )
+        elif file_type == 'document':
+            return InlineQueryResultCachedDocument(
+                id=result_id, document_file_id=doc['file_id'], title=title, caption=caption, parse_mode='HTML'
+            )
+
+        # Indexed files and types without a cached inline result (e.g. video notes) are shared as a link
+        return InlineQueryResultArticle(
+            id=result_id,
+            title=title,
+            input_message_content=InputTextMessageContent(f"{title}\n{self.worker_url}/{doc['file_code']}")
+        )
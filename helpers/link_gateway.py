@@ -0,0 +1,112 @@
+from aiohttp import web
+from config.database import secondary_reads
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND_PAGE = (
+    "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Link not found</title></head>"
+    "<body style=\"font-family:sans-serif;text-align:center;padding-top:15%\">"
+    "<h2>This link is invalid or the file was deleted.</h2>"
+    "<p>এই লিঙ্কটি সঠিক নয় অথবা ফাইলটি মুছে ফেলা হয়েছে।</p>"
+    "</body></html>"
+)
+
+# All the gateway needs to tell whether a delivery bot can send a file
+COPY_SOURCE_FIELDS = ("storage_chat_id", "storage_message_id", "source_chat_id", "source_message_id")
+
+class LinkGateway:
+    def __init__(self, db, bot_pool, file_sender, ingest_journal, valid_ttl: int = 300, missing_ttl: int = 60, max_entries: int = 100000):
+        self.db = db
+        self.bot_pool = bot_pool
+        self.file_sender = file_sender
+        self.ingest_journal = ingest_journal
+        self.files_collection = db['files']
+        self.batches_collection = db['batches']
+        self.files_reads = secondary_reads(self.files_collection)
+        self.batches_reads = secondary_reads(self.batches_collection)
+        self.valid_ttl = valid_ttl
+        self.missing_ttl = missing_ttl
+        self.max_entries = max_entries
+        self.cache = {}  # code -> (expires_at, exists, primary_only)
+
+    def setup(self, app: web.Application):
+        """Register the resolver route. Must be added after all other top-level routes."""
+        app.router.add_get('/{code:(?:batch_)?[A-Za-z0-9]+}', self.handle_link)
+
+    async def resolve(self, code: str) -> tuple:
+        """Check whether a code exists and whether only the primary bot can send it,
+        using the cache when possible"""
+        cached = self.cache.get(code)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+
+        doc = await asyncio.to_thread(self._lookup, code)
+        exists = doc is not None
+        primary_only = exists and self._primary_only(code, doc)
+        if len(self.cache) >= self.max_entries:
+            self.cache.clear()
+        ttl = self.valid_ttl if exists else self.missing_ttl
+        self.cache[code] = (time.monotonic() + ttl, exists, primary_only)
+        return exists, primary_only
+
+    def _primary_only(self, code: str, doc: dict) -> bool:
+        files = doc.get('files', []) if code.startswith('batch_') else [doc]
+        return any(self.file_sender.primary_only(file_info) for file_info in files)
+
+    def _lookup(self, code: str):
+        # Codes that were just uploaded, in any worker, may not be replayed to Mongo yet
+        if code.startswith('batch_'):
+            doc = self.ingest_journal.lookup_anywhere('batches', code[6:])
+            if doc:
+                return doc
+            collections, query = (self.batches_reads, self.batches_collection), {"batch_code": code[6:]}
+            projection = {f"files.{field}": 1 for field in COPY_SOURCE_FIELDS}
+        else:
+            doc = self.ingest_journal.lookup_anywhere('files', code)
+            if doc:
+                return doc
+            collections, query = (self.files_reads, self.files_collection), {"file_code": code}
+            projection = {field: 1 for field in COPY_SOURCE_FIELDS}
+        # Misses are cached, so confirm them on the primary in case the secondary is behind
+        for collection in collections:
+            doc = collection.find_one(query, projection)
+            if doc is not None:
+                return doc
+        return None
+
+    async def handle_link(self, request: web.Request):
+        """Redirect valid codes to the bot and answer dead ones with a 404"""
+        code = request.match_info['code']
+        # Links are spread across the delivery bots by code
+        bot_username = self.bot_pool.username_for_code(code)
+        if not bot_username:
+            raise web.HTTPServiceUnavailable(text="Bot is starting, please retry")
+
+        try:
+            exists, primary_only = await self.resolve(code)
+        except Exception as e:
+            # Fail open: let the bot answer if the database is unavailable
+            logger.error(f"Error resolving link {code}: {str(e)}")
+            raise web.HTTPFound(
+                f"https://t.me/{bot_username}?start={code}",
+                headers={'Cache-Control': 'no-store'}
+            )
+
+        if exists:
+            if primary_only:
+                # Delivery bots can't copy this file, so don't send the user to one
+                bot_username = self.bot_pool.primary.username
+            raise web.HTTPFound(
+                f"https://t.me/{bot_username}?start={code}",
+                headers={'Cache-Control': f"public, max-age={self.valid_ttl}"}
+            )
+
+        return web.Response(
+            text=NOT_FOUND_PAGE,
+            status=404,
+            content_type='text/html',
+            headers={'Cache-Control': f"public, max-age={self.missing_ttl}"}
+        )
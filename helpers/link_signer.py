@@ -0,0 +1,60 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def get_link_secret() -> bytes:
+    """Secret for signing direct links: LINK_SECRET, or derived from the bot token"""
+    secret = os.getenv('LINK_SECRET')
+    if secret:
+        return secret.encode()
+    return hmac.new(os.getenv('BOT_TOKEN', '').encode(), b'gdirect-links', hashlib.sha256).digest()
+
+class InvalidLink(Exception):
+    pass
+
+class LinkSigner:
+    def __init__(self, secret: bytes):
+        self.secret = secret
+
+    def _signature(self, payload: str) -> str:
+        return _b64url(hmac.new(self.secret, payload.encode(), hashlib.sha256).digest()[:16])
+
+    def sign(self, drive_id: str, expires_at: int, ip: str = None, byte_range: tuple = None) -> str:
+        """Create a token carrying the drive id, expiry and optional IP/byte-range scope"""
+        data = {'d': drive_id, 'e': int(expires_at)}
+        if ip:
+            data['ip'] = ip
+        if byte_range:
+            data['r'] = [int(byte_range[0]), int(byte_range[1])]
+        payload = _b64url(json.dumps(data, separators=(',', ':')).encode())
+        return f"{payload}.{self._signature(payload)}"
+
+    def verify(self, token: str, ip: str = None) -> dict:
+        """Return the token data, or raise InvalidLink without touching anything upstream"""
+        try:
+            payload, signature = token.split('.')
+        except ValueError:
+            raise InvalidLink('Malformed link')
+
+        if not hmac.compare_digest(signature, self._signature(payload)):
+            raise InvalidLink('Invalid signature')
+
+        try:
+            data = json.loads(_b64url_decode(payload))
+        except ValueError:
+            raise InvalidLink('Malformed link')
+
+        if data.get('e', 0) < time.time():
+            raise InvalidLink('Link has expired')
+        if data.get('ip') and data['ip'] != ip:
+            raise InvalidLink('Link is not valid for this address')
+        return data
@@ -6,33 +6,71 @@ import os
 
 class LoginHandler:
     def __init__(self, db):
-        self.client = TelegramClient('session_name', os.getenv('API_ID'), os.getenv('API_HASH'))
+        self._client = None
         self.is_logged_in = False
         self.db = db
 
+    @property
+    def client(self):
+        """Build the Telethon client (and open its session file) on first use"""
+        if self._client is None:
+            self._client = TelegramClient('session_name', int(os.getenv('API_ID')), os.getenv('API_HASH'))
+        return self._client
+
+    async def ensure_connected(self) -> bool:
+        """Connect the client and report whether the saved session is authorized"""
+        if not self.client.is_connected():
+            await self.client.connect()
+        self.is_logged_in = await self.client.is_user_authorized()
+        return self.is_logged_in
+
     async def handle_login(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle login process"""
-        await update.message.reply_text("Please enter your phone number:")
+        message = update.message or update.callback_query.message
+        if await self.ensure_connected():
+            await message.reply_text("Already logged in ✅")
+            return
+        await message.reply_text("Please enter your phone number:")
         context.user_data['awaiting_phone'] = True
 
+    async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Route text replies to the current login step"""
+        if context.user_data.get('awaiting_phone'):
+            await self.check_phone(update, context)
+        elif context.user_data.get('awaiting_code'):
+            await self.check_code(update, context)
+        elif context.user_data.get('awaiting_password'):
+            await self.check_password(update, context)
+
     async def check_phone(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Check the entered phone number and send code"""
         if context.user_data.get('awaiting_phone'):
-            phone = update.message.text
+            phone = update.message.text.strip()
             try:
-                await self.client.start(phone)
-                await update.message.reply_text("A code has been sent to your phone. Please enter the code:")
+                await self.ensure_connected()
+                sent = await self.client.send_code_request(phone)
+                context.user_data['login_phone'] = phone
+                context.user_data['phone_code_hash'] = sent.phone_code_hash
+                await update.message.reply_text(
+                    "A code has been sent to your phone. Please enter the code with spaces between the digits "
+                    "(e.g. 1 2 3 4 5) so Telegram doesn't expire it:"
+                )
                 context.user_data['awaiting_phone'] = False
                 context.user_data['awaiting_code'] = True
             except Exception as e:
                 await update.message.reply_text(f"Failed to send code: {str(e)}")
+                context.user_data['awaiting_phone'] = False
 
     async def check_code(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Check the entered code"""
         if context.user_data.get('awaiting_code'):
-            code = update.message.text
+            code = update.message.text.replace(' ', '')
             try:
-                await self.client.sign_in(code=code)
+                await self.client.sign_in(
+                    phone=context.user_data.get('login_phone'),
+                    code=code,
+                    phone_code_hash=context.user_data.get('phone_code_hash')
+                )
                 self.is_logged_in = True
                 await update.message.reply_text("Login successful! ✅")
                 self.save_login_info(update.effective_user.id)
@@ -0,0 +1,136 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from aiohttp import web
+from collections import Counter
+from .task_supervisor import supervisor
+import asyncio
+import logging
+import os
+import resource
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+class MemoryTracker:
+    """RSS, live tasks, registry sizes and tracemalloc growth, for /memory and /metrics"""
+    def __init__(self, trace_interval: int = 0, frames: int = 10, top: int = 15):
+        self.trace_interval = trace_interval  # Seconds between tracemalloc snapshots, 0 = off
+        self.frames = frames
+        self.top = top
+        self.registries = {}  # name -> callable returning the container
+        self.last_snapshot = None
+        self.last_diff = []  # Top allocation growth between the last two snapshots
+        self._task = None
+
+    def register(self, name: str, getter):
+        """Track the size of an in-process container, e.g. register('batch.user_files', lambda: handler.user_files)"""
+        self.registries[name] = getter
+
+    def start(self):
+        if self.trace_interval and not self._task:
+            tracemalloc.start(self.frames)
+            self._task = supervisor.spawn('loops', self._snapshot_loop)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+            tracemalloc.stop()
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.trace_interval)
+            try:
+                self.take_snapshot()
+            except Exception as e:
+                logger.error(f"Error taking memory snapshot: {str(e)}")
+
+    def take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        if self.last_snapshot:
+            self.last_diff = snapshot.compare_to(self.last_snapshot, 'lineno')[:self.top]
+        self.last_snapshot = snapshot
+
+    def rss_bytes(self) -> int:
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        # Peak RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def registry_sizes(self) -> dict:
+        sizes = {}
+        for name, getter in self.registries.items():
+            try:
+                sizes[name] = len(getter())
+            except Exception:
+                sizes[name] = -1
+        return sizes
+
+    def task_counts(self) -> Counter:
+        """Live asyncio tasks grouped by supervisor name, or coroutine name for the rest"""
+        counts = Counter()
+        for task in asyncio.all_tasks():
+            name = task.get_name()
+            if name.startswith('Task-'):
+                coro = task.get_coro()
+                name = getattr(coro, '__qualname__', type(coro).__name__)
+            counts[name] += 1
+        return counts
+
+    async def handle_memory_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /memory command"""
+        tasks = self.task_counts()
+        text = (
+            f"🧠 <b>Memory</b>\n\n"
+            f"RSS: {self.rss_bytes() / 1024 / 1024:.1f} MB\n"
+            f"Tasks: {sum(tasks.values())}\n"
+        )
+        for name, count in tasks.most_common(8):
+            text += f"  {count} × <code>{name}</code>\n"
+
+        text += "\n<b>Registries</b>\n"
+        for name, size in sorted(self.registry_sizes().items()):
+            text += f"{name}: {size}\n"
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            text += f"\n<b>tracemalloc</b> ({current / 1024 / 1024:.1f} MB traced, peak {peak / 1024 / 1024:.1f} MB)\n"
+            if self.last_diff:
+                text += f"Growth over the last {self.trace_interval}s:\n"
+                for stat in self.last_diff[:10]:
+                    frame = stat.traceback[0]
+                    text += f"{stat.size_diff / 1024:+.1f} KB  <code>{os.path.basename(frame.filename)}:{frame.lineno}</code>\n"
+            else:
+                text += "Waiting for the second snapshot...\n"
+        else:
+            text += "\nSet MEMORY_TRACE_INTERVAL to enable tracemalloc snapshots."
+
+        await update.message.reply_text(text, parse_mode='HTML')
+
+    async def handle_metrics(self, request: web.Request):
+        """Prometheus text format"""
+        lines = [
+            "# TYPE bot_rss_bytes gauge",
+            f"bot_rss_bytes {self.rss_bytes()}",
+            "# TYPE bot_asyncio_tasks gauge",
+            f"bot_asyncio_tasks {len(asyncio.all_tasks())}",
+            "# TYPE bot_registry_size gauge",
+        ]
+        for name, size in sorted(self.registry_sizes().items()):
+            lines.append(f'bot_registry_size{{name="{name}"}} {size}')
+        if tracemalloc.is_tracing():
+            current, _ = tracemalloc.get_traced_memory()
+            lines.append("# TYPE bot_tracemalloc_bytes gauge")
+            lines.append(f"bot_tracemalloc_bytes {current}")
+        return web.Response(text='\n'.join(lines) + '\n', content_type='text/plain')
+
+    def setup(self, app: web.Application):
+        app.router.add_get('/metrics', self.handle_metrics)
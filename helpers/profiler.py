@@ -0,0 +1,94 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from collections import Counter
+from .task_supervisor import supervisor
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+
+class Profiler:
+    """Sampling profiler for the live event loop: a thread records its stack every few milliseconds"""
+    def __init__(self, interval: float = 0.005, max_seconds: int = 300, top: int = 25):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.top = top
+        self.task = None
+        supervisor.add_group('profiler', limit=1)
+
+    def _frame_name(self, frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+    def _sample(self, thread_id: int, seconds: float) -> tuple:
+        """Runs in its own thread; returns (collapsed stack counts, number of samples)"""
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                names = []
+                while frame is not None:
+                    names.append(self._frame_name(frame))
+                    frame = frame.f_back
+                stacks[';'.join(reversed(names))] += 1
+                samples += 1
+            time.sleep(self.interval)
+        return stacks, samples
+
+    def _report(self, stacks: Counter, samples: int, seconds: float) -> str:
+        own = Counter()  # Function at the top of the stack
+        total = Counter()  # Function anywhere in the stack
+        for stack, count in stacks.items():
+            names = stack.split(';')
+            own[names[-1]] += count
+            for name in set(names):
+                total[name] += count
+
+        lines = [f"Sampled the event loop for {seconds}s: {samples} samples every {self.interval * 1000:.0f}ms", ""]
+        lines.append(f"Top {self.top} by own time:")
+        for name, count in own.most_common(self.top):
+            lines.append(f"{count / samples:6.1%}  {name}")
+        lines.append("")
+        lines.append(f"Top {self.top} by total time:")
+        for name, count in total.most_common(self.top):
+            lines.append(f"{count / samples:6.1%}  {name}")
+        return '\n'.join(lines)
+
+    async def handle_profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /profile command"""
+        if self.task and not self.task.done():
+            await update.message.reply_text("A profile is already running.")
+            return
+        try:
+            seconds = int(context.args[0]) if context.args else 30
+        except ValueError:
+            await update.message.reply_text("Usage: /profile <seconds>")
+            return
+        seconds = max(1, min(seconds, self.max_seconds))
+
+        await update.message.reply_text(f"⏱ Profiling for {seconds}s...")
+        # Run in the background so updates keep flowing while we sample
+        self.task = supervisor.spawn('profiler', self._run, update, seconds)
+
+    async def _run(self, update: Update, seconds: int):
+        stacks, samples = await asyncio.to_thread(self._sample, threading.get_ident(), seconds)
+        if not samples:
+            await update.message.reply_text("No samples were collected.")
+            return
+
+        report = self._report(stacks, samples, seconds)
+        collapsed = '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+        await update.message.reply_document(
+            document=io.BytesIO(report.encode()),
+            filename='profile_report.txt',
+            caption=f"Hotspots ({samples} samples)"
+        )
+        await update.message.reply_document(
+            document=io.BytesIO(collapsed.encode()),
+            filename='profile.collapsed',
+            caption="Collapsed stacks for flamegraph.pl or speedscope"
+        )
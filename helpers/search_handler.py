@@ -0,0 +1,103 @@
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import TEXT, DESCENDING
+from config.database import secondary_reads
+import html
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SearchHandler:
+    def __init__(self, db, page_size: int = 10, max_saved: int = 20):
+        self.db = db
+        self.files_collection = secondary_reads(db['files'])  # Read-only
+        self.page_size = page_size
+        self.max_saved = max_saved  # Result messages per user whose Next button keeps working
+        self.worker_url = os.getenv('WORKER_URL', '').rstrip('/')
+
+    def ensure_indexes(self):
+        """Create the text index used by /search"""
+        try:
+            self.files_collection.create_index(
+                [('file_name', TEXT), ('caption', TEXT)],
+                name='files_text'
+            )
+        except Exception as e:
+            logger.error(f"Error creating search index: {str(e)}")
+
+    def search(self, query: str, before_id: ObjectId = None):
+        """Return one page of matching files, newest first, and whether more exist"""
+        filter_query = {"$text": {"$search": query}}
+        if before_id:
+            filter_query["_id"] = {"$lt": before_id}
+
+        cursor = self.files_collection.find(
+            filter_query,
+            {"file_code": 1, "file_name": 1, "caption": 1}
+        ).sort("_id", DESCENDING).limit(self.page_size + 1)
+
+        results = list(cursor)
+        return results[:self.page_size], len(results) > self.page_size
+
+    async def handle_search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /search command"""
+        if not context.args:
+            await update.message.reply_text("Please provide a search term.\nExample: /search avengers")
+            return
+
+        query = ' '.join(context.args)
+        text, reply_markup = self._render_page(query)
+        sent = await update.message.reply_text(
+            text,
+            reply_markup=reply_markup,
+            parse_mode='HTML',
+            disable_web_page_preview=True
+        )
+        if reply_markup:
+            # Keyed by result message so an older result's Next button doesn't page through a newer search
+            queries = context.user_data.setdefault('search_queries', {})
+            queries[sent.message_id] = query
+            while len(queries) > self.max_saved:
+                queries.pop(next(iter(queries)))
+
+    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle search pagination buttons"""
+        query = update.callback_query
+        await query.answer()
+
+        search_query = context.user_data.get('search_queries', {}).get(query.message.message_id)
+        if not search_query:
+            await query.message.edit_text("Search expired. Please run /search again.")
+            return
+
+        try:
+            before_id = ObjectId(query.data.replace('search_next_', ''))
+        except InvalidId:
+            return
+
+        text, reply_markup = self._render_page(search_query, before_id)
+        await query.message.edit_text(
+            text,
+            reply_markup=reply_markup,
+            parse_mode='HTML',
+            disable_web_page_preview=True
+        )
+
+    def _render_page(self, query: str, before_id: ObjectId = None):
+        results, has_more = self.search(query, before_id)
+        if not results:
+            return f"🔍 No files found for <b>{html.escape(query)}</b>", None
+
+        text = f"🔍 <b>Results for:</b> {html.escape(query)}\n\n"
+        for i, doc in enumerate(results):
+            name = doc.get('caption') or doc.get('file_name') or 'No Name'
+            text += f"{i+1}. {html.escape(name)}\n{self.worker_url}/{doc['file_code']}\n\n"
+
+        reply_markup = None
+        if has_more:
+            keyboard = [[InlineKeyboardButton("Next ➡️", callback_data=f"search_next_{results[-1]['_id']}")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+        return text, reply_markup
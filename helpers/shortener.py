@@ -1,21 +1,44 @@
 import aiohttp
 import json
+import logging
+from .tracing import span
+from .task_supervisor import supervisor
+
+logger = logging.getLogger(__name__)
 
 class Shortener:
     def __init__(self, config):
         self.config = config
+        # Bulk uploads shouldn't open dozens of connections to the shortener at once
+        supervisor.add_group('shortener', limit=4)
+
+    @property
+    def enabled(self) -> bool:
+        shortener_config = self.config.get('shortener', {})
+        return bool(shortener_config.get('enabled') and shortener_config.get('api_key') and shortener_config.get('api_url'))
+
+    def shorten_later(self, message, url: str):
+        """Swap url for its short form in an already sent message, in the background"""
+        if self.enabled:
+            supervisor.spawn('shortener', self._replace_in_message, message, url)
+
+    async def _replace_in_message(self, message, url: str):
+        short_url = await self.shorten_url(url)
+        if short_url == url:
+            return
+        try:
+            await message.edit_text(message.text.replace(url, short_url))
+        except Exception as e:
+            logger.error(f"Error adding short link to message: {str(e)}")
     
     async def shorten_url(self, url: str) -> str:
         """Shorten URL using ModijiUrl"""
-        shortener_config = self.config.get('shortener', {})
-        if not shortener_config.get('enabled'):
+        if not self.enabled:
             return url
-            
+
+        shortener_config = self.config.get('shortener', {})
         api_key = shortener_config.get('api_key')
         api_url = shortener_config.get('api_url')
-        
-        if not api_key or not api_url:
-            return url
             
         try:
             params = {
@@ -24,13 +47,14 @@ class Shortener:
                 'format': 'text'
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as response:
-                    if response.status == 200:
-                        short_url = await response.text()
-                        return short_url.strip()
+            with span('shortener'):
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(api_url, params=params) as response:
+                        if response.status == 200:
+                            short_url = await response.text()
+                            return short_url.strip()
             
         except Exception as e:
-            print(f"Error shortening URL: {str(e)}")
+            logger.error(f"Error shortening URL: {str(e)}")
             
         return url 
\ No newline at end of file
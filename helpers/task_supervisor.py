@@ -0,0 +1,134 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from collections import deque
+import asyncio
+import html
+import logging
+import time
+from .tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+class TaskGroup:
+    """Policy and counters for one kind of background work"""
+    def __init__(self, name: str, limit: int = 0, retries: int = 0, backoff: float = 1):
+        self.name = name
+        self.limit = limit  # Max tasks running at once, 0 = unlimited
+        self.retries = retries  # Extra attempts after a failure
+        self.backoff = backoff  # First retry delay in seconds, doubled per attempt
+        self.semaphore = asyncio.Semaphore(limit) if limit else None
+        self.tasks = {}  # task -> start time
+        self.waiting = 0  # Tasks queued behind the concurrency cap
+        self.started = 0
+        self.failed = 0
+        self.retried = 0
+
+class TaskSupervisor:
+    """Runs background work in named groups with concurrency caps, retries and error capture"""
+    def __init__(self, max_errors: int = 20):
+        self.groups = {}
+        self.errors = deque(maxlen=max_errors)  # (time, task name, error) of recent failures
+        self.closed = False
+
+    def add_group(self, name: str, limit: int = 0, retries: int = 0, backoff: float = 1) -> TaskGroup:
+        """Declare a group's policy; the first declaration wins"""
+        if name not in self.groups:
+            self.groups[name] = TaskGroup(name, limit, retries, backoff)
+        return self.groups[name]
+
+    def spawn(self, group: str, func, *args, name: str = None) -> asyncio.Task:
+        """Run func(*args) in the background. func is called again for each retry, so pass the
+        coroutine function rather than a coroutine."""
+        if self.closed:
+            raise RuntimeError("Task supervisor is shut down")
+        task_group = self.add_group(group)
+        name = f"{group}:{name or getattr(func, '__qualname__', repr(func))}"
+        task = asyncio.create_task(self._run(task_group, name, func, args), name=name)
+        task_group.tasks[task] = time.monotonic()
+        task_group.started += 1
+        task.add_done_callback(lambda t: self._done(task_group, t))
+        return task
+
+    async def _run(self, group: TaskGroup, name: str, func, args):
+        # The task copied the context of the update that spawned it; that trace is
+        # finished (or soon will be), so don't keep it alive or add spans to it
+        current_trace.set(None)
+        if group.semaphore:
+            group.waiting += 1
+            try:
+                await group.semaphore.acquire()
+            finally:
+                group.waiting -= 1
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return await func(*args)
+                except Exception as e:
+                    group.failed += 1
+                    self.errors.append((time.time(), name, f"{type(e).__name__}: {str(e)}"))
+                    if attempt >= group.retries:
+                        raise
+                    delay = min(group.backoff * 2 ** attempt, 60)
+                    attempt += 1
+                    group.retried += 1
+                    logger.warning(f"{name} failed, retry {attempt}/{group.retries} in {delay}s: {str(e)}")
+                    await asyncio.sleep(delay)
+        finally:
+            if group.semaphore:
+                group.semaphore.release()
+
+    def _done(self, group: TaskGroup, task: asyncio.Task):
+        group.tasks.pop(task, None)
+        # Retrieving the exception here also keeps asyncio from warning about it;
+        # callers awaiting the task still get it raised
+        if not task.cancelled() and task.exception():
+            logger.error(f"Background task {task.get_name()} failed", exc_info=task.exception())
+
+    def running(self) -> list:
+        """(task name, seconds running) of every live task, longest first"""
+        now = time.monotonic()
+        tasks = [
+            (task.get_name(), now - started)
+            for group in self.groups.values()
+            for task, started in group.tasks.items()
+        ]
+        return sorted(tasks, key=lambda item: item[1], reverse=True)
+
+    async def shutdown(self, timeout: float = 5):
+        """Cancel every task and wait for them to unwind"""
+        self.closed = True
+        tasks = [task for group in self.groups.values() for task in group.tasks]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            if pending:
+                logger.warning(f"{len(pending)} background tasks did not stop within {timeout}s")
+
+    async def handle_tasks_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /tasks command"""
+        text = "⚙️ <b>Background tasks</b>\n\n"
+        for group in self.groups.values():
+            limit = f"/{group.limit}" if group.limit else ""
+            text += (
+                f"<b>{group.name}</b>: {len(group.tasks) - group.waiting}{limit} running"
+                f"{f', {group.waiting} waiting' if group.waiting else ''}"
+                f" · {group.started} started, {group.failed} failed, {group.retried} retried\n"
+            )
+
+        longest = self.running()[:5]
+        if longest:
+            text += "\n<b>Longest running</b>\n"
+            for name, seconds in longest:
+                text += f"{seconds:.0f}s <code>{html.escape(name)}</code>\n"
+
+        if self.errors:
+            text += "\n<b>Recent failures</b>\n"
+            for failed_at, name, error in list(self.errors)[-5:]:
+                text += f"{time.strftime('%H:%M:%S', time.localtime(failed_at))} <code>{html.escape(name)}</code>: {html.escape(error[:200])}\n"
+
+        await update.message.reply_text(text, parse_mode='HTML')
+
+# One supervisor per process, shared by every handler
+supervisor = TaskSupervisor()
@@ -0,0 +1,146 @@
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import HTTPXRequest
+from pymongo import monitoring
+from contextlib import contextmanager
+import contextvars
+import json
+import logging
+import os
+import time
+import uuid
+
+slow_logger = logging.getLogger('slow_updates')
+
+# Trace of the update being handled; asyncio tasks and to_thread calls inherit it
+current_trace = contextvars.ContextVar('current_trace', default=None)
+# Updates taking longer than this go to the slow-update log
+SLOW_UPDATE_MS = int(os.getenv('SLOW_UPDATE_MS', '2000'))
+
+class Trace:
+    """Timing spans collected while one update is handled"""
+    def __init__(self, update):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.update_id = getattr(update, 'update_id', None)
+        self.user_id = None
+        self.kind = type(update).__name__
+        if isinstance(update, Update):
+            if update.effective_user:
+                self.user_id = update.effective_user.id
+            if update.message and update.message.text:
+                self.kind = update.message.text.split()[0][:32]
+            elif update.callback_query:
+                self.kind = f"callback:{(update.callback_query.data or '')[:32]}"
+            elif update.inline_query:
+                self.kind = 'inline_query'
+            elif update.message:
+                self.kind = 'message'
+        self.started = time.monotonic()
+        self.spans = []
+        self.error = None
+
+    def add_span(self, name: str, started: float, duration: float):
+        self.spans.append({
+            'name': name,
+            'start_ms': round((started - self.started) * 1000, 1),
+            'duration_ms': round(duration * 1000, 1)
+        })
+
+    def to_dict(self, duration: float) -> dict:
+        span_ms = sum(span['duration_ms'] for span in self.spans)
+        return {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'trace_id': self.trace_id,
+            'update_id': self.update_id,
+            'user_id': self.user_id,
+            'kind': self.kind,
+            'duration_ms': round(duration * 1000, 1),
+            # Time not covered by a Mongo/Telegram/shortener span: the handler's own work
+            'handler_ms': round(max(0, duration * 1000 - span_ms), 1),
+            'spans': self.spans,
+            'error': self.error
+        }
+
+@contextmanager
+def span(name: str):
+    """Time a block as part of the current trace, if any"""
+    trace = current_trace.get()
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        if trace:
+            trace.add_span(name, started, time.monotonic() - started)
+
+class MongoSpanListener(monitoring.CommandListener):
+    """Adds a span for every Mongo command run inside a trace"""
+    def __init__(self):
+        self.commands = {}  # request id -> (trace, span name)
+
+    def started(self, event):
+        trace = current_trace.get()
+        if trace:
+            collection = event.command.get(event.command_name)
+            name = f"mongo.{event.command_name}"
+            if isinstance(collection, str):
+                name += f".{collection}"
+            self.commands[event.request_id] = (trace, name)
+
+    def _finished(self, event):
+        command = self.commands.pop(event.request_id, None)
+        if command:
+            trace, name = command
+            duration = event.duration_micros / 1e6
+            trace.add_span(name, time.monotonic() - duration, duration)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+class TracedRequest(HTTPXRequest):
+    """Adds a span for every Bot API call"""
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        with span(f"telegram.{url.rsplit('/', 1)[-1]}"):
+            return await super().do_request(url, method, *args, **kwargs)
+
+class TracedApplication(Application):
+    """Runs each update under its own trace and logs the slow ones"""
+    async def process_update(self, update: object):
+        trace = Trace(update)
+        token = current_trace.set(trace)
+        try:
+            await super().process_update(update)
+        finally:
+            current_trace.reset(token)
+            finish_trace(trace)
+
+def finish_trace(trace: Trace):
+    duration = time.monotonic() - trace.started
+    if duration * 1000 >= SLOW_UPDATE_MS:
+        slow_logger.info(json.dumps(trace.to_dict(duration), ensure_ascii=False))
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        trace = current_trace.get()
+        record.trace_id = trace.trace_id if trace else '-'
+        return True
+
+def setup_tracing():
+    """Configure logging with trace ids and the slow-update log, and time Mongo commands"""
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+    # PTB and httpx log every request at INFO
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    # One JSON object per line, nothing else in the file
+    slow_handler = logging.FileHandler(os.getenv('SLOW_UPDATE_LOG', 'slow_updates.jsonl'))
+    slow_handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_logger.addHandler(slow_handler)
+    slow_logger.propagate = False
+
+    # Must run before the MongoClient is created
+    monitoring.register(MongoSpanListener())
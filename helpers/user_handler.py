@@ -1,47 +1,151 @@
 from telegram import Update
 from telegram.ext import ContextTypes
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from collections import OrderedDict
 from datetime import datetime
-import os
+from config.database import relaxed_writes
+from .user_stats import UserStats
+from .task_supervisor import supervisor
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 class UserHandler:
-    def __init__(self, db):
+    def __init__(self, db, acl, seen_interval: int = 300, max_seen: int = 50000, flush_interval: int = 2):
         self.db = db
-        self.users_collection = db['users']
+        self.acl = acl
+        # Last-seen times and unblock flags are rewritten constantly
+        self.users_collection = relaxed_writes(db['users'])
+        self.stats = UserStats(db)
+        self.seen_interval = seen_interval  # Seconds between last_seen writes per user
+        self.max_seen = max_seen
+        self.flush_interval = flush_interval
+        self.seen = OrderedDict()  # (user_id, bot_id) -> (monotonic time, day) of last write
+        self.pending = {}  # user_id -> (username, bot ids) waiting for the next flush
+        self._flush_task = None
+
+    def ensure_indexes(self):
+        """Every flush and broadcast update goes by user_id"""
+        try:
+            self.users_collection.create_index('user_id', unique=True)
+        except OperationFailure as e:
+            # Older data can hold duplicate users; still index the lookups
+            logger.warning(f"Creating a non-unique users.user_id index: {str(e)}")
+            self.users_collection.create_index('user_id')
+
+    async def handle_new_user(self, user_id: int, username: str = None, bot_id: int = None):
+        """Queue user registration/last_seen update unless seen recently"""
+        now = time.monotonic()
+        today = self.stats.today()
+        key = (user_id, bot_id)
+        seen = self.seen.get(key)
+        if seen and now - seen[0] < self.seen_interval and seen[1] == today:
+            return
+
+        self.seen[key] = (now, today)
+        self.seen.move_to_end(key)
+        while len(self.seen) > self.max_seen:
+            self.seen.popitem(last=False)
+
+        # Remember which bots the user started; only those can message them
+        bot_ids = self.pending[user_id][1] if user_id in self.pending else set()
+        if bot_id:
+            bot_ids.add(bot_id)
+        self.pending[user_id] = (username, bot_ids)
+
+    def start(self):
+        """Start the periodic flush loop"""
+        if not self._flush_task:
+            self._flush_task = supervisor.spawn('loops', self._flush_loop)
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
 
-    async def handle_new_user(self, user_id: int, username: str = None):
-        """Add new user to database if not exists"""
-        if not self.users_collection.find_one({"user_id": user_id}):
-            self.users_collection.insert_one({
-                "user_id": user_id,
-                "username": username,
-                "joined_at": datetime.now()
-            })
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Upsert queued users in bulk and update the stats rollups"""
+        if not self.pending:
+            return
+        if not self.stats.ready:
+            # Users upserted before the backfill counts them would be counted twice or not at all
+            try:
+                await asyncio.to_thread(self.stats.ensure_counters)
+            except Exception as e:
+                logger.error(f"Error backfilling user counters: {str(e)}")
+                return
+        pending, self.pending = self.pending, {}
+        try:
+            await asyncio.to_thread(self._write, pending, datetime.now(), self.stats.today())
+        except Exception as e:
+            logger.error(f"Error flushing users: {str(e)}")
+            for user_id, entry in pending.items():
+                self.pending.setdefault(user_id, entry)
+
+    def _write(self, pending: dict, now: datetime, today: str):
+        # One read tells which users are new today or blocked, so a single bulk write can
+        # register them, mark them active and unblock them
+        existing = {
+            doc['user_id']: doc for doc in self.users_collection.find(
+                {"user_id": {"$in": list(pending)}},
+                {"_id": 0, "user_id": 1, "last_active_day": 1, "blocked": 1}
+            )
+        }
+        ops = []
+        active = unblocked = 0
+        for user_id, (username, bot_ids) in pending.items():
+            doc = existing.get(user_id, {})
+            fields = {"username": username, "last_seen": now}
+            if doc.get('last_active_day') != today:
+                fields["last_active_day"] = today
+                active += 1
+            # Users who come back after blocking the bot can receive messages again
+            if doc.get('blocked'):
+                fields["blocked"] = False
+                unblocked += 1
+            update = {"$setOnInsert": {"user_id": user_id, "joined_at": now}, "$set": fields}
+            if bot_ids:
+                update["$addToSet"] = {"bots": {"$each": list(bot_ids)}}
+            ops.append(UpdateOne({"user_id": user_id}, update, upsert=True))
+        result = self.users_collection.bulk_write(ops, ordered=False)
+        if result.upserted_count:
+            self.stats.user_joined(result.upserted_count)
+        if active:
+            self.stats.user_active(active)
+        if unblocked:
+            self.stats.user_unblocked(unblocked)
 
     async def get_users_count(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /users command"""
-        if not await self._is_admin(update.effective_user.id):
+        if not self.acl.is_admin(update.effective_user.id):
             await update.message.reply_text("You don't have permission to use this command!")
             return
 
-        total_users = self.users_collection.count_documents({})
-        active_users = self.users_collection.count_documents({"blocked": {"$ne": True}})
+        counters = self.stats.get_counters()
+        total_users = counters['total']
+        blocked_users = counters['blocked']
         
         stats = (
             f"📊 <b>Bot Statistics</b>\n\n"
             f"Total Users: {total_users}\n"
-            f"Active Users: {active_users}\n"
-            f"Blocked Users: {total_users - active_users}"
+            f"Active Users: {total_users - blocked_users}\n"
+            f"Blocked Users: {blocked_users}"
         )
         
-        await update.message.reply_text(stats, parse_mode='HTML')
-
-    async def _is_admin(self, user_id: int) -> bool:
-        """Check if user is admin or sudo user"""
-        # Get admin ID from env
-        admin_id = int(os.getenv('ADMIN_ID', '0'))
-        
-        # Get sudo users from env
-        sudo_users = os.getenv('SUDO_USERS', '')
-        sudo_list = [int(id.strip()) for id in sudo_users.split(',') if id.strip()]
+        # Show daily growth when asked: /users trend
+        if context.args and context.args[0].lower() == 'trend':
+            stats += "\n\n📈 <b>Last 7 days</b> (joined / active / blocked)\n"
+            for day in self.stats.get_trend(7):
+                stats += f"{day['day']}: +{day['joined']} / {day['active']} / {day['blocked']}\n"
         
-        return user_id == admin_id or user_id in sudo_list 
\ No newline at end of file
+        await update.message.reply_text(stats, parse_mode='HTML')
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+from config.database import relaxed_writes, secondary_reads
+import threading
+
+class UserStats:
+    def __init__(self, db):
+        self.db = db
+        self.users_collection = db['users']
+        self.stats_collection = secondary_reads(relaxed_writes(db['user_stats']))
+        self.ready = False  # Set once the counters are backfilled; joins counted before would be lost
+        self.backfill_lock = threading.Lock()
+
+    def ensure_counters(self):
+        """Backfill the counters document once from the users collection"""
+        with self.backfill_lock:
+            if self.ready:
+                return
+            # A counters document can exist without the backfill, created by an $inc that got there first
+            counters = self.db['user_stats'].find_one({"_id": "counters"})
+            if not (counters and counters.get('backfilled')):
+                total = self.users_collection.count_documents({})
+                blocked = self.users_collection.count_documents({"blocked": True})
+                self.stats_collection.update_one(
+                    {"_id": "counters"},
+                    {"$set": {"total": total, "blocked": blocked, "backfilled": True}},
+                    upsert=True
+                )
+            self.ready = True
+
+    def _day_id(self, day: datetime) -> str:
+        return f"day:{day.strftime('%Y%m%d')}"
+
+    def today(self) -> str:
+        return datetime.now().strftime('%Y%m%d')
+
+    def _inc(self, counters: dict = None, daily: dict = None):
+        if counters:
+            self.stats_collection.update_one({"_id": "counters"}, {"$inc": counters}, upsert=True)
+        if daily:
+            now = datetime.now()
+            self.stats_collection.update_one(
+                {"_id": self._day_id(now)},
+                {
+                    "$inc": daily,
+                    "$setOnInsert": {"period": "day", "bucket": now.replace(hour=0, minute=0, second=0, microsecond=0)}
+                },
+                upsert=True
+            )
+
+    def user_joined(self, count: int = 1):
+        self._inc({"total": count}, {"joined": count})
+
+    def user_active(self, count: int = 1):
+        self._inc(daily={"active": count})
+
+    def user_blocked(self, count: int = 1):
+        self._inc({"blocked": count}, {"blocked": count})
+
+    def user_unblocked(self, count: int = 1):
+        self._inc({"blocked": -count})
+
+    def get_counters(self) -> dict:
+        """Return total and blocked user counts"""
+        counters = self.stats_collection.find_one({"_id": "counters"}) or {}
+        return {
+            'total': counters.get('total', 0),
+            'blocked': counters.get('blocked', 0)
+        }
+
+    def get_trend(self, days: int = 7) -> list:
+        """Return daily rollups for the last N days, oldest first"""
+        now = datetime.now()
+        ids = [self._day_id(now - timedelta(days=i)) for i in range(days)]
+        docs = {doc['_id']: doc for doc in self.stats_collection.find({"_id": {"$in": ids}})}
+        trend = []
+        for i in reversed(range(days)):
+            day = now - timedelta(days=i)
+            doc = docs.get(self._day_id(day), {})
+            trend.append({
+                'day': day.strftime('%d %b'),
+                'joined': doc.get('joined', 0),
+                'active': doc.get('active', 0),
+                'blocked': doc.get('blocked', 0)
+            })
+        return trend
@@ -0,0 +1,127 @@
+from telegram import Bot, Update
+import multiprocessing
+import asyncio
+import queue
+import signal
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WorkerPool:
+    """Ingress side of the multi-process mode: polls Telegram and hands updates to N worker processes"""
+    def __init__(self, tokens: list, workers: int, worker_target, queue_size: int = 10000, pinned=None):
+        self.tokens = tokens
+        self.workers = workers
+        self.pinned = pinned  # user id -> True if the user's updates must go to worker 0
+        self.worker_target = worker_target
+        # spawn gives every worker a clean interpreter (no inherited event loop or sockets)
+        self.context = multiprocessing.get_context('spawn')
+        self.queues = [self.context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.processes = [self._process(i) for i in range(workers)]
+        self.restarts = [0] * workers  # Consecutive quick crashes per worker, for the respawn backoff
+        self.offsets = {}  # bot index -> next update offset
+
+    def _process(self, index: int):
+        return self.context.Process(
+            target=self.worker_target, args=(index, self.queues[index], self.tokens), name=f"bot-worker-{index}"
+        )
+
+    async def _watch(self, min_uptime: int = 60):
+        """Respawn workers that died; their queued updates wait for the replacement"""
+        started = [time.monotonic()] * self.workers
+        while True:
+            await asyncio.sleep(1)
+            for i, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                # Back off when a worker keeps crashing right after start
+                self.restarts[i] = self.restarts[i] + 1 if time.monotonic() - started[i] < min_uptime else 1
+                delay = min(2 ** (self.restarts[i] - 1), 60)
+                logger.error(f"Worker {i} exited with code {process.exitcode}, respawning in {delay}s")
+                await asyncio.sleep(delay)
+                self.processes[i] = self._process(i)
+                self.processes[i].start()
+                started[i] = time.monotonic()
+
+    @staticmethod
+    def affinity_key(data: dict) -> int:
+        """Route all updates from one user to the same worker, so batch sessions stay consistent"""
+        for value in data.values():
+            if isinstance(value, dict):
+                if isinstance(value.get('from'), dict):
+                    return value['from']['id']
+                if isinstance(value.get('chat'), dict):
+                    return value['chat']['id']
+        return data.get('update_id', 0)
+
+    async def _dispatch(self, bot_index: int, update: Update):
+        data = update.to_dict()
+        key = self.affinity_key(data)
+        # Worker 0 owns the Telethon session, so admin commands and their follow-up messages go there
+        worker = 0 if self.pinned and self.pinned(key) else key % self.workers
+        try:
+            self.queues[worker].put_nowait((bot_index, data))
+        except queue.Full:
+            # Backpressure: stop polling until the worker catches up
+            await asyncio.get_running_loop().run_in_executor(None, self.queues[worker].put, (bot_index, data))
+
+    async def _poll(self, bot_index: int, bot: Bot):
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=self.offsets.get(bot_index),
+                    timeout=25,
+                    read_timeout=35,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            except Exception as e:
+                logger.error(f"Error polling updates for @{bot.username}: {str(e)}")
+                await asyncio.sleep(3)
+                continue
+
+            for update in updates:
+                await self._dispatch(bot_index, update)
+                self.offsets[bot_index] = update.update_id + 1
+
+    async def run(self, bots: list, drain_timeout: int = 30):
+        """Start the workers and poll every bot until SIGINT/SIGTERM. Returns (drain seconds, timed out)"""
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        for process in self.processes:
+            process.start()
+        logger.info(f"Ingress running with {self.workers} workers and {len(bots)} token(s)...")
+
+        watcher = asyncio.create_task(self._watch())
+        pollers = [asyncio.create_task(self._poll(i, bot)) for i, bot in enumerate(bots)]
+        await stop_event.wait()
+        started = time.monotonic()
+        for task in pollers + [watcher]:
+            task.cancel()
+        await asyncio.gather(*pollers, watcher, return_exceptions=True)
+
+        # Confirm dispatched updates so they aren't delivered again after restart
+        for bot_index, offset in self.offsets.items():
+            try:
+                await bots[bot_index].get_updates(offset=offset, timeout=0)
+            except Exception:
+                pass
+        # Workers get the drain deadline plus time to flush their state
+        timed_out = not await self.stop(drain_timeout + 30)
+        return time.monotonic() - started, timed_out
+
+    async def stop(self, timeout: int = 30) -> bool:
+        """Tell workers to finish their queues, then wait for them to exit. Returns False if any was killed"""
+        for q in self.queues:
+            q.put(None)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, process.join, timeout) for process in self.processes))
+        stopped = True
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+                stopped = False
+        return stopped
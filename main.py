@@ -1,6 +1,9 @@
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
-from config.database import connect_db
+import time
+started_at = time.monotonic()  # Process start, for the startup timings
+
+from telegram import Bot, Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler, InlineQueryHandler, TypeHandler
+from config.database import connect_db, secondary_reads
 import os
 from dotenv import load_dotenv
 from helpers.batch_handler import BatchHandler
@@ -13,68 +16,211 @@ from helpers.bot_settings import BotSettings
 from helpers.shortener import Shortener
 from helpers.delete_handler import DeleteHandler
 from helpers.direct_link_handler import DirectLinkHandler
+from helpers.download_counter import DownloadCounter
+from helpers.search_handler import SearchHandler
+from helpers.inline_handler import InlineHandler
+from helpers.bot_pool import BotPool
+from helpers.file_sender import FileSender
+from helpers.ingest_journal import IngestJournal
+from helpers.acl import ACL
+from helpers.profiler import Profiler
+from helpers.memory_tracker import MemoryTracker
+from helpers.task_supervisor import supervisor
+from helpers.tracing import TracedApplication, TracedRequest, current_trace, setup_tracing
 from aiohttp import web
-import subprocess
+import signal
 import sys
 from restart import restart
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# Connect to MongoDB
-db = connect_db()
-files_collection = db['files']
-
-# Initialize config first
-config = Config(db)
-
-# Initialize all handlers
-batch_handler = BatchHandler(db, config)
-user_handler = UserHandler(db)
-broadcast_handler = BroadcastHandler(db)
-auto_delete_handler = AutoDeleteHandler(db)
-bot_settings = BotSettings(config)
-shortener = Shortener(config)
-delete_handler = DeleteHandler(db, config)
-direct_link_handler = DirectLinkHandler(config)
-
-def is_authorized(user_id: int) -> bool:
-    """Check if user is admin or sudo user"""
-    admin_id = int(os.getenv('ADMIN_ID', '0'))
-    sudo_users = config.get('sudo_users', [])
-    return user_id == admin_id or user_id in sudo_users
+# Seconds to let in-flight updates finish when stopping
+DRAIN_TIMEOUT = int(os.getenv('DRAIN_TIMEOUT', '30'))
+# Set in worker processes of the multi-process mode
+worker_index = None
+first_update_seen = False
+
+# Filled in by bootstrap()
+db = files_collection = config = acl = bot_pool = file_sender = ingest_journal = None
+auto_delete_handler = batch_handler = user_handler = broadcast_handler = None
+bot_settings = shortener = delete_handler = direct_link_handler = None
+download_counter = search_handler = inline_handler = profiler = memory_tracker = None
+link_gateway = drive_proxy = login_handler = channel_indexer = autoforward_handler = None
+
+async def bootstrap():
+    """Connect to MongoDB and build the handlers for the enabled features."""
+    global db, files_collection, config, acl, bot_pool, file_sender, ingest_journal
+    global auto_delete_handler, batch_handler, user_handler, broadcast_handler
+    global bot_settings, shortener, delete_handler, direct_link_handler
+    global download_counter, search_handler, inline_handler, profiler, memory_tracker
+    global link_gateway, drive_proxy, login_handler, channel_indexer, autoforward_handler
+
+    # Logging and Mongo command timing must be set up before the client exists
+    setup_tracing()
+    # Flush, sync and snapshot loops are restarted if they crash
+    supervisor.add_group('loops', retries=5)
+
+    # Connect to MongoDB (the client connects lazily, on the first query)
+    db = connect_db()
+    files_collection = db['files']
+    config = Config(db)
+    acl = ACL(config)
+
+    # Bots sharing this process (primary first) and the file delivery built on them
+    bot_pool = BotPool()
+    file_sender = FileSender(config, bot_pool)
+
+    # New files and batches are journaled locally first, so uploads work while Mongo is down
+    shared_journal_path = os.getenv('INGEST_JOURNAL', 'ingest_journal.jsonl')
+    if worker_index is not None:
+        ingest_journal = IngestJournal(db, f"{shared_journal_path}.{worker_index}", shared_journal_path, has_peers=True)
+    else:
+        ingest_journal = IngestJournal(db, shared_journal_path, has_peers=int(os.getenv('WORKERS', '1')) > 1)
+        # Workers aren't running yet; take over whatever their journals still hold
+        ingest_journal.adopt_peers()
+
+    # Initialize all handlers
+    auto_delete_handler = AutoDeleteHandler(db)
+    batch_handler = BatchHandler(db, config, file_sender, auto_delete_handler, ingest_journal)
+    user_handler = UserHandler(db, acl)
+    broadcast_handler = BroadcastHandler(db, bot_pool, acl)
+    bot_settings = BotSettings(config, acl)
+    shortener = Shortener(config)
+    delete_handler = DeleteHandler(db, config, acl, ingest_journal)
+    direct_link_handler = DirectLinkHandler(config, signed=bool(os.getenv('SERVICE_ACCOUNTS')))
+    download_counter = DownloadCounter(db)
+    profiler = Profiler()
+    search_handler = SearchHandler(db)
+    inline_handler = InlineHandler(db, config)
+
+    # Optional features import their dependencies only when enabled
+    if os.getenv('LINK_GATEWAY', 'false').lower() == 'true':
+        from helpers.link_gateway import LinkGateway
+        link_gateway = LinkGateway(db, bot_pool, file_sender, ingest_journal)
+    if os.getenv('SERVICE_ACCOUNTS'):
+        from helpers.drive_proxy import DriveProxy, load_service_accounts
+        from helpers.link_signer import LinkSigner, get_link_secret
+        drive_proxy = DriveProxy(
+            load_service_accounts(os.getenv('SERVICE_ACCOUNTS')),
+            LinkSigner(get_link_secret()),
+            trust_forwarded=os.getenv('TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+        )
+    # Telethon user session, needed for channel indexing and auto-forwarding
+    # The session file can only be opened by one process, so other workers don't get these commands
+    if os.getenv('API_ID') and os.getenv('API_HASH') and worker_index in (None, 0):
+        from helpers.login_handler import LoginHandler
+        from helpers.channel_indexer import ChannelIndexer
+        from helpers.autoforward_handler import AutoForwardHandler
+        login_handler = LoginHandler(db)
+        channel_indexer = ChannelIndexer(db, login_handler)
+        autoforward_handler = AutoForwardHandler(config, db, login_handler, acl)
+
+    memory_tracker = MemoryTracker(int(os.getenv('MEMORY_TRACE_INTERVAL', '0')))
+    register_registries()
+
+    # Serve from the config snapshot right away; only a first boot waits for Mongo
+    if config.has_snapshot:
+        config.start_reconcile()
+    else:
+        await config.reconcile()
+    supervisor.spawn('startup', prepare_database)
+    logger.info(f"Bootstrap finished in {time.monotonic() - started_at:.2f}s")
+
+def register_registries():
+    """In-process containers that /memory and /metrics report the size of."""
+    memory_tracker.register('batch.user_files', lambda: batch_handler.user_files)
+    memory_tracker.register('settings.waiting_for_input', lambda: bot_settings.waiting_for_input)
+    memory_tracker.register('auto_delete.tasks', lambda: auto_delete_handler.tasks)
+    memory_tracker.register('auto_delete.deadlines', lambda: auto_delete_handler.deadlines)
+    memory_tracker.register('auto_delete.deliveries', lambda: auto_delete_handler.deliveries)
+    memory_tracker.register('users.seen', lambda: user_handler.seen)
+    memory_tracker.register('users.pending', lambda: user_handler.pending)
+    memory_tracker.register('downloads.pending', lambda: download_counter.pending)
+    memory_tracker.register('inline.cache', lambda: inline_handler.cache)
+    memory_tracker.register('inline.inflight', lambda: inline_handler.inflight)
+    memory_tracker.register('journal.pending', lambda: ingest_journal.pending)
+    if link_gateway:
+        memory_tracker.register('gateway.cache', lambda: link_gateway.cache)
+    if drive_proxy:
+        memory_tracker.register('drive.metadata_cache', lambda: drive_proxy.metadata_cache)
+    if autoforward_handler:
+        memory_tracker.register('autoforward.seen', lambda: autoforward_handler.seen)
+    if channel_indexer:
+        memory_tracker.register('indexer.running', lambda: channel_indexer.running)
+
+async def prepare_database():
+    """Build indexes and load handler settings once Mongo is reachable."""
+    await config.synced.wait()
+    # Independent round trips, so run them together
+    setup = [search_handler.ensure_indexes, inline_handler.ensure_indexes, user_handler.ensure_indexes,
+             user_handler.stats.ensure_counters, auto_delete_handler.load_delete_time,
+             auto_delete_handler.ensure_indexes, ingest_journal.ensure_indexes]
+    if channel_indexer:
+        setup.append(channel_indexer.ensure_indexes)
+    if autoforward_handler:
+        setup.append(autoforward_handler.load_settings)
+    results = await asyncio.gather(*(asyncio.to_thread(step) for step in setup), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error preparing database: {str(result)}")
+
+def find_shared(collection: str, field: str, code: str):
+    """Look up a shared file or batch: journal first, then a secondary, then the primary."""
+    doc = ingest_journal.lookup_anywhere(collection, code)
+    if doc:
+        return doc
+    query = {field: code}
+    # A secondary may not have a just-replayed upload yet, so only the primary can confirm a miss
+    return secondary_reads(db[collection]).find_one(query) or db[collection].find_one(query)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
     # Add user to database
     await user_handler.handle_new_user(
         update.effective_user.id,
-        update.effective_user.username
+        update.effective_user.username,
+        context.bot.id
     )
     
     if len(context.args) > 0:
         arg = context.args[0]
         
+        # Already delivered and not deleted yet: point at it instead of sending again
+        if await auto_delete_handler.remind_delivery(context.bot, update.effective_chat.id, arg):
+            return
+
         # Check if it's a batch link
         if arg.startswith('batch_'):
             batch_code = arg[6:]  # Remove 'batch_' prefix
-            batch_doc = db['batches'].find_one({"batch_code": batch_code})
+            batch_doc = find_shared('batches', 'batch_code', batch_code)
             
             if batch_doc:
-                await batch_handler.handle_batch_start(update, context, batch_doc)
+                # The primary bot counts the download if this one only pointed the user there
+                if await batch_handler.handle_batch_start(update, context, batch_doc):
+                    download_counter.record(arg)
             else:
                 await update.message.reply_text("Batch not found!")
             return
                 
         # Regular single file handling continues here...
-        file_doc = files_collection.find_one({"file_code": arg})
+        file_doc = find_shared('files', 'file_code', arg)
         
         if file_doc:
+            if not file_sender.can_send(context.bot, file_doc):
+                # Only the primary bot holds this file
+                await update.message.reply_text(f"Please get this file here:\n{file_sender.primary_link(arg)}")
+                return
+
             try:
                 sent_messages = []
                 
                 # Fetch auto-delete time from config
                 delete_time = config.get('auto_delete_time', 30)
+                await bot_pool.acquire(context.bot)
                 info_msg = await update.message.reply_text(
                     f"⚠️ This file will be automatically deleted after {delete_time} minute{'s' if delete_time != 1 else ''}!\n"
                     f"🔄 Forward this File to save the file.\n\n"
@@ -83,53 +229,17 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 sent_messages.append(info_msg)
                 
-                # Get file info
-                file_type = file_doc.get('file_type', 'document')
-                original_caption = file_doc.get('caption', '')
-                prefix_name = config.get('prefix_name', '@CinemazBD')
-                
-                # Format caption
-                if original_caption:
-                    caption = f"{prefix_name} - {original_caption}"  # Add prefix with hyphen
-                else:
-                    caption = f"{prefix_name}\n<b>Here's your file!</b>"
-                
-                # Make the whole caption bold
-                caption = f"<b>{caption}</b>"
-                
-                if file_type == 'photo':
-                    sent_msg = await update.message.reply_photo(
-                        photo=file_doc['file_id'],
-                        caption=caption,
-                        parse_mode='HTML'
-                    )
-                elif file_type == 'video':
-                    sent_msg = await update.message.reply_video(
-                        video=file_doc['file_id'],
-                        caption=caption,
-                        parse_mode='HTML'
-                    )
-                elif file_type == 'audio':
-                    sent_msg = await update.message.reply_audio(
-                        audio=file_doc['file_id'],
-                        caption=caption,
-                        parse_mode='HTML'
-                    )
-                else:
-                    sent_msg = await update.message.reply_document(
-                        document=file_doc['file_id'],
-                        caption=caption,
-                        parse_mode='HTML'
-                    )
+                sent_msg = await file_sender.send_file(context.bot, update.effective_chat.id, file_doc)
                     
                 # Add sent file message to list
                 sent_messages.append(sent_msg)
                 
                 # Schedule messages for auto-deletion
-                await auto_delete_handler.handle_shared_files(sent_messages)
+                await auto_delete_handler.handle_shared_files(sent_messages, arg)
+                download_counter.record(arg)
                 
             except Exception as e:
-                print(f"Error sending file: {str(e)}")
+                logger.error(f"Error sending file: {str(e)}")
                 await update.message.reply_text("Sorry, couldn't send the file!")
         else:
             await update.message.reply_text("File not found!")
@@ -143,7 +253,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle files sent to the bot."""
-    if not is_authorized(update.effective_user.id):
+    if not acl.is_admin(update.effective_user.id):
         await update.message.reply_text("You don't have permission to use this feature!")
         return
 
@@ -173,35 +283,35 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if file:
         try:
-            file_code = str(abs(hash(file.file_id)))[:8]
+            # Keep a copy that delivery bots can read
+            storage = await file_sender.store(message)
             
-            # Save to database
-            files_collection.insert_one({
+            # Save to the journal under a free code; it reaches the database in the background
+            file_code = await ingest_journal.append('files', {
                 "file_id": file.file_id,
-                "file_code": file_code,
                 "file_type": file_type,
                 "file_name": getattr(file, 'file_name', None),
                 "mime_type": getattr(file, 'mime_type', None),
                 "caption": message.caption,
-                "user_id": update.message.from_user.id
+                "user_id": update.message.from_user.id,
+                **storage
             })
             
             # Generate permanent link using worker URL
             worker_url = os.getenv('WORKER_URL', '').rstrip('/')
             share_link = f"{worker_url}/{file_code}"
             
-            # Shorten the link if enabled
-            shortened_link = await shortener.shorten_url(share_link)
-            
             # Prepare file name or caption
             file_name_or_caption = message.caption or getattr(file, 'file_name', 'No Name')
             
-            await update.message.reply_text(
-                f"Here's your permanent shareable link:\n{shortened_link}\n\nFile: {file_name_or_caption}"
+            # Reply with the worker link right away; the short link is edited in when it's ready
+            reply = await update.message.reply_text(
+                f"Here's your permanent shareable link:\n{share_link}\n\nFile: {file_name_or_caption}"
             )
+            shortener.shorten_later(reply, share_link)
             
         except Exception as e:
-            print(f"Error: {str(e)}")
+            logger.error(f"Error: {str(e)}")
             await update.message.reply_text(
                 "Sorry, there was an error processing your file."
             )
@@ -209,29 +319,94 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Add error handler
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Log Errors caused by Updates."""
-    print(f"Update {update} caused error {context.error}")
+    trace = current_trace.get()
+    if trace:
+        trace.error = str(context.error)
+    logger.error(f"Update {update} caused error {context.error}", exc_info=context.error)
 
 async def authorized_command(update: Update, context: ContextTypes.DEFAULT_TYPE, command_func):
     """Wrapper to check if user is authorized before executing command."""
-    if is_authorized(update.effective_user.id):
+    if acl.is_admin(update.effective_user.id):
         await command_func(update, context)
     else:
         await update.message.reply_text("You don't have permission to use this command!")
 
 async def restart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Restart the bot if the user is authorized."""
-    if is_authorized(update.effective_user.id):
-        await update.message.reply_text("Restarting the bot...")
-        restart()
+    if acl.is_admin(update.effective_user.id):
+        status_msg = await update.message.reply_text("Restarting the bot...")
+        db['runtime'].replace_one(
+            {"_id": "restart"},
+            {"chat_id": status_msg.chat_id, "message_id": status_msg.message_id, "requested_at": time.time()},
+            upsert=True
+        )
+        # Same path as SIGTERM: stop intake, drain, then main() restarts the process
+        pid = os.getppid() if worker_index is not None else os.getpid()
+        os.kill(pid, signal.SIGTERM)
     else:
         await update.message.reply_text("You don't have permission to restart the bot!")
 
-def main():
-    """Start the bot."""
-    # Create the Application
-    application = Application.builder().token(os.getenv('BOT_TOKEN')).build()
+async def post_init(application: Application, leader: bool = True):
+    """Start background workers once the event loop is running."""
+    ingest_journal.start()
+    memory_tracker.start()
+    if worker_index is not None:
+        # /bset runs in one worker; the others pick the change up from Mongo
+        config.start_watch()
+    download_counter.start()
+    user_handler.start()
+    # Only one process may drive the Telethon session or replay saved state
+    if leader:
+        supervisor.spawn('startup', restore_state, application)
+
+async def restore_state(application: Application):
+    """Pick up work saved by the previous run once Mongo is reachable."""
+    await config.synced.wait()
+    try:
+        await auto_delete_handler.resume(bot_pool)
+        await report_restart(application)
+    except Exception as e:
+        logger.error(f"Error restoring saved state: {str(e)}")
+    if autoforward_handler:
+        await autoforward_handler.resume()
+
+async def report_restart(application: Application):
+    """Tell the admin who ran /restart how the handover went."""
+    state = db['runtime'].find_one_and_delete({"_id": "restart"})
+    if not state or 'drain_seconds' not in state:
+        return
+    try:
+        await application.bot.edit_message_text(
+            chat_id=state['chat_id'],
+            message_id=state['message_id'],
+            text=(
+                f"✅ Bot restarted\n\n"
+                f"Drain: {state['drain_seconds']:.1f}s{' (deadline reached)' if state.get('drain_timed_out') else ''}\n"
+                f"Downtime: {time.time() - state['stopped_at']:.1f}s"
+            )
+        )
+    except Exception as e:
+        logger.error(f"Error reporting restart: {str(e)}")
+
+async def post_shutdown(application: Application):
+    """Flush background workers before exit."""
+    auto_delete_handler.stop()
+    memory_tracker.stop()
+    await ingest_journal.stop()
+    await download_counter.stop()
+    await user_handler.stop()
+    if autoforward_handler:
+        await autoforward_handler.stop()
+    # Whatever is still running (timers, indexing jobs, retries) is cancelled
+    await supervisor.shutdown()
 
-    # Add handlers
+def register_delivery_handlers(application: Application):
+    """Handlers for extra bot tokens, which only deliver shared files."""
+    application.add_handler(CommandHandler("start", start))
+    application.add_error_handler(error_handler)
+
+def register_handlers(application: Application):
+    """Handlers for the primary bot."""
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("batch", lambda u, c: authorized_command(u, c, batch_handler.handle_batch_command)))
     
@@ -256,6 +431,19 @@ def main():
     # Add new handlers
     application.add_handler(CommandHandler("users", lambda u, c: authorized_command(u, c, user_handler.get_users_count)))
     application.add_handler(CommandHandler("broadcast", lambda u, c: authorized_command(u, c, broadcast_handler.broadcast_message)))
+    application.add_handler(CommandHandler("top", lambda u, c: authorized_command(u, c, download_counter.handle_top_command)))
+    application.add_handler(CommandHandler("search", lambda u, c: authorized_command(u, c, search_handler.handle_search_command)))
+    application.add_handler(CallbackQueryHandler(search_handler.handle_callback, pattern='^search_'))
+    application.add_handler(InlineQueryHandler(inline_handler.handle_inline_query))
+
+    # Add Telethon login, channel indexer and autoforward handlers
+    if login_handler:
+        application.add_handler(CommandHandler("login", lambda u, c: authorized_command(u, c, login_handler.handle_login)))
+        application.add_handler(CommandHandler("index", lambda u, c: authorized_command(u, c, channel_indexer.handle_index_command)))
+        application.add_handler(CommandHandler("autoforward", lambda u, c: authorized_command(u, c, autoforward_handler.handle_autoforward_command)))
+        application.add_handler(CallbackQueryHandler(autoforward_handler.button_click, pattern='^af_'))
+        # Separate group so the settings text handler still sees every message
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, autoforward_handler.handle_text), group=1)
 
     # Add settings handler
     application.add_handler(CommandHandler("bset", lambda u, c: authorized_command(u, c, bot_settings.handle_settings)))
@@ -279,29 +467,175 @@ def main():
     # Add restart handler
     application.add_handler(CommandHandler("restart", restart_command))
 
-    # Start the Bot
-    print("Bot is running...")
-    application.run_polling()
+    # Add delivery bots status handler
+    application.add_handler(CommandHandler("bots", lambda u, c: authorized_command(u, c, bot_pool.handle_bots_command)))
+    application.add_handler(CommandHandler("profile", lambda u, c: authorized_command(u, c, profiler.handle_profile_command)))
+    application.add_handler(CommandHandler("tasks", lambda u, c: authorized_command(u, c, supervisor.handle_tasks_command)))
+    application.add_handler(CommandHandler("memory", lambda u, c: authorized_command(u, c, memory_tracker.handle_memory_command)))
+
+async def run_bots(applications: list):
+    """Run all bots on one event loop until SIGINT/SIGTERM."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await asyncio.gather(*(application.initialize() for application in applications))
+    for application in applications:
+        bot_pool.add(application.bot)
+    await post_init(applications[0])
+
+    for application in applications:
+        await application.start()
+        await application.updater.start_polling()
+    logger.info(f"Bot is running with {len(applications)} token(s), ready {time.monotonic() - started_at:.2f}s after start")
+
+    await stop_event.wait()
+    started = time.monotonic()
+    for application in applications:
+        await application.updater.stop()
+    timed_out = not await drain(applications)
+    return time.monotonic() - started, timed_out
+
+async def drain(applications: list) -> bool:
+    """Finish in-flight updates within DRAIN_TIMEOUT, then flush state. Returns False on timeout."""
+    stopping = asyncio.ensure_future(asyncio.gather(*(application.stop() for application in applications)))
+    done, _ = await asyncio.wait([stopping], timeout=DRAIN_TIMEOUT)
+    if not done:
+        logger.warning(f"Drain deadline reached after {DRAIN_TIMEOUT}s, abandoning in-flight updates")
+    await post_shutdown(applications[0])
+    if done:
+        for application in applications:
+            await application.shutdown()
+    return bool(done)
+
+async def note_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Log time-to-first-update once per process."""
+    global first_update_seen
+    if not first_update_seen:
+        first_update_seen = True
+        logger.info(f"First update received {time.monotonic() - started_at:.2f}s after start")
+
+def build_applications(tokens: list, polling: bool = True) -> list:
+    """The primary bot handles everything; extra tokens only deliver shared files."""
+    applications = []
+    for i, token in enumerate(tokens):
+        # Every update gets a trace id and spans for its Bot API calls
+        builder = (
+            Application.builder()
+            .token(token)
+            .application_class(TracedApplication)
+            .request(TracedRequest(connection_pool_size=256))
+        )
+        if not polling:
+            # Updates come from the ingress process instead
+            builder = builder.updater(None)
+        application = builder.build()
+        application.add_handler(TypeHandler(Update, note_first_update), group=-1)
+        if i == 0:
+            register_handlers(application)
+        else:
+            register_delivery_handlers(application)
+        applications.append(application)
+    return applications
+
+def run_worker(index: int, update_queue, tokens: list):
+    """Worker process entry point for the multi-process mode."""
+    # The ingress process handles Ctrl+C and tells workers to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    global worker_index
+    worker_index = index
+    asyncio.run(_run_worker(index, update_queue, tokens))
+
+async def _run_worker(index: int, update_queue, tokens: list):
+    await bootstrap()
+    applications = build_applications(tokens, polling=False)
+    await asyncio.gather(*(application.initialize() for application in applications))
+    for application in applications:
+        bot_pool.add(application.bot)
+    await post_init(applications[0], leader=index == 0)
+    for application in applications:
+        await application.start()
+    logger.info(f"Worker {index} ready {time.monotonic() - started_at:.2f}s after start")
+
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(None, update_queue.get)
+        if item is None:
+            break
+        bot_index, data = item
+        application = applications[bot_index]
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    await drain(applications)
+
+async def run_ingress(tokens: list, workers: int):
+    """Poll Telegram in this process and run the handlers in worker processes."""
+    from helpers.worker_pool import WorkerPool
+    bots = [Bot(token) for token in tokens]
+    await asyncio.gather(*(bot.initialize() for bot in bots))
+    for bot in bots:
+        bot_pool.add(bot)
+    # Admin updates are routed by role, so keep the ACL current with /bset changes
+    config.start_watch()
+    # Replays what adopt_peers() took over from a previous run
+    ingest_journal.start()
+    result = await WorkerPool(tokens, workers, run_worker, pinned=acl.is_admin).run(bots, DRAIN_TIMEOUT)
+    await ingest_journal.stop()
+    for bot in bots:
+        await bot.shutdown()
+    return result
+
+def main():
+    """Start the bot."""
+    tokens = [os.getenv('BOT_TOKEN')]
+    tokens += [t.strip() for t in os.getenv('EXTRA_BOT_TOKENS', '').split(',') if t.strip()]
+    workers = int(os.getenv('WORKERS', '1'))
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(bootstrap())
+    run_web_server()
+    if workers > 1:
+        drain_seconds, timed_out = loop.run_until_complete(run_ingress(tokens, workers))
+    else:
+        drain_seconds, timed_out = loop.run_until_complete(run_bots(build_applications(tokens)))
+    logger.info(f"Stopped after draining for {drain_seconds:.1f}s")
+
+    # A pending /restart request turns this shutdown into a restart
+    state = db['runtime'].find_one_and_update(
+        {"_id": "restart", "drain_seconds": {"$exists": False}},
+        {"$set": {"drain_seconds": drain_seconds, "drain_timed_out": timed_out, "stopped_at": time.time()}}
+    )
+    if state:
+        restart()
 
 # Define a simple health check endpoint
 async def health_check(request):
     return web.Response(text="OK")
 
-# Create an aiohttp web application
-app = web.Application()
-app.router.add_get('/health', health_check)
+def build_web_app() -> web.Application:
+    """Create the aiohttp web application for the enabled features."""
+    app = web.Application()
+    app.router.add_get('/health', health_check)
+    memory_tracker.setup(app)
+
+    # Optional Google Drive proxy for /gdirect links
+    if drive_proxy:
+        drive_proxy.setup(app)
+
+    # Optional link resolver (registered last, it matches any top-level code)
+    if link_gateway:
+        link_gateway.setup(app)
+    return app
 
 # Function to run the web server
 def run_web_server():
-    runner = web.AppRunner(app)
+    runner = web.AppRunner(build_web_app())
     loop = asyncio.get_event_loop()
     loop.run_until_complete(runner.setup())
     site = web.TCPSite(runner, '0.0.0.0', 8080)
     loop.run_until_complete(site.start())
-    print("Health check server running on port 8080")
-
-# Call the function to run the web server
-run_web_server()
+    logger.info("Health check server running on port 8080")
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -1,16 +1,19 @@
 import os
 import sys
-import subprocess
+import logging
+
+logger = logging.getLogger(__name__)
 
 def restart():
-    """Restart the bot."""
+    """Restart the bot in place once it has drained."""
     try:
-        # Get the current Python executable and main script path
+        if os.getenv('RESTART_MODE', 'exec') == 'exit':
+            # Let the supervisor (Docker restart policy, systemd, ...) start a fresh process
+            sys.exit(0)
+
+        # Replace this process with a fresh one: same PID, no overlap with the old instance
         python = sys.executable
         script = os.path.abspath('main.py')
-
-        # Execute the main script again
-        subprocess.Popen([python, script])
-        os._exit(0)
-    except Exception as e:
-        print(f"Failed to restart: {e}")
+        os.execv(python, [python, script])
+    except OSError as e:
+        logger.error(f"Failed to restart: {e}")
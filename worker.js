@@ -9,6 +9,8 @@ const SERVICE_ACCOUNTS = [
 ];
 
 let currentAccountIndex = 0;
+// Public URL of the bot's web server; signed /gdirect links are validated and served there
+const GDIRECT_ORIGIN = "";
 const LINK_VALIDITY_DURATION = 6 * 60 * 60 * 1000; // 6 hours in milliseconds
 
 function base64UrlEncode(str) {
@@ -35,6 +37,13 @@ async function handleRequest(request) {
     const path = url.pathname.slice(1); // Remove leading slash
 
     if (path.startsWith('gdirect/')) {
+        if (GDIRECT_ORIGIN) {
+            return fetch(`${GDIRECT_ORIGIN}/${path}`, {
+                method: request.method,
+                headers: request.headers
+            });
+        }
+
         const encodedParts = path.split('gdirect/')[1];
         if (!encodedParts) {
             return new Response('File ID or timestamp not found', { status: 404 });
@@ -58,15 +67,28 @@ async function handleRequest(request) {
         return await handleDriveDownload(driveId, request);
     }
 
-    // Existing bot redirect logic
-    const BOT_USERNAME = "autoforwardbd_bot";
-    if (path.startsWith('batch_')) {
-        return Response.redirect(`https://t.me/${BOT_USERNAME}?start=${path}`, 301);
-    }
-
     // Ensure no leading slash in the start parameter
     const cleanPath = path.replace(/^\//, '');
-    return Response.redirect(`https://t.me/${BOT_USERNAME}?start=${cleanPath}`, 301);
+    return Response.redirect(`https://t.me/${botForCode(cleanPath)}?start=${cleanPath}`, 301);
+}
+
+// Same order as BOT_TOKEN followed by EXTRA_BOT_TOKENS
+const BOT_USERNAMES = ["autoforwardbd_bot"];
+
+// Spread codes across bots exactly like BotPool.bot_for_code (zlib.crc32)
+function botForCode(code) {
+    return BOT_USERNAMES[crc32(code) % BOT_USERNAMES.length];
+}
+
+function crc32(str) {
+    let crc = -1;
+    for (let i = 0; i < str.length; i++) {
+        crc ^= str.charCodeAt(i);
+        for (let k = 0; k < 8; k++) {
+            crc = (crc >>> 1) ^ (0xEDB88320 & -(crc & 1));
+        }
+    }
+    return (crc ^ -1) >>> 0;
 }
 
 async function handleDriveDownload(driveId, request) {